@@ -0,0 +1,194 @@
+"""
+Async read path of the ASGI deployment (ASGI_MODE): hot GET endpoints
+answered by coroutine views on the async ORM, so a waiting request
+doesn't hold a worker. Responses have the same JSON as sync viewsets:
+serializers are reused and run in a thread, as they may reach for
+the cache or the database on fragment misses.
+
+Everything off the fast path - writes, other formats, cursor pages,
+invalid parameters, 404s - goes to sync viewsets unchanged.
+"""
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse
+from django.urls import path
+from django.utils.cache import patch_vary_headers
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.authentication import aauthenticate
+from api.filters import RecipesFilter, autocomplete_ingredients
+from api.pagination import PageLimitPagination
+from api.serializers import (IngredientSerializer, ReadRecipeSerializer,
+                             SubscriptionSerializer, TagSerializer)
+from api.views import (IngredientViewSet, RecipeViewSet, TagViewSet,
+                       UserViewSet, get_authors_queryset,
+                       get_ingredient_search_limit)
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update',
+                  'patch': 'partial_update', 'delete': 'destroy'}
+
+
+def async_view(fallback):
+    """
+    Coroutine view for JSON GET requests; handler returning None
+    and any other request are served by sync `fallback` view.
+    """
+    fallback = sync_to_async(fallback)
+
+    def decorator(handler):
+        async def view(request, **kwargs):
+            if (request.method == 'GET' and 'format' not in request.GET
+                    and 'text/html' not in request.headers.get('Accept', '')):
+                user = await aauthenticate(request)
+                if user is not None:
+                    request.user = user
+                    response = await handler(request, **kwargs)
+                    if response is not None:
+                        return response
+            return await fallback(request, **kwargs)
+
+        # sync viewsets check CSRF themselves
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+def json_response(data):
+    response = HttpResponse(JSONRenderer().render(data),
+                            content_type='application/json')
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+async def serialize(serializer_class, instance, request, many=False):
+    return await sync_to_async(lambda: serializer_class(
+        instance, many=many, context={'request': request}).data)()
+
+
+async def paginate(request, queryset, serializer_class):
+    """
+    Page of PageLimitPagination with its own page size, page number
+    and links, while COUNT and page SELECT go through async ORM.
+    None for invalid page, which sync viewset answers with 404.
+    """
+    pagination = PageLimitPagination()
+    drf_request = Request(request)
+    paginator = pagination.django_paginator_class(
+        queryset, pagination.get_page_size(drf_request))
+    paginator.count = await queryset.acount()
+    try:
+        page = paginator.page(
+            pagination.get_page_number(drf_request, paginator))
+    except InvalidPage:
+        return None
+    # iterating queryset itself keeps prefetch_related working
+    page.object_list = [obj async for obj in page.object_list]
+    pagination.page, pagination.request = page, drf_request
+    data = await serialize(serializer_class, page.object_list, request, True)
+    return json_response(pagination.get_paginated_response(data).data)
+
+
+def filter_recipes(request):
+    """Recipes filtered as in RecipeViewSet list, None if invalid."""
+    filterset = RecipesFilter(
+        request.GET, request=request,
+        queryset=Recipe.objects.with_user_flags(request.user).
+        select_related('author'))
+    return filterset.qs if filterset.is_valid() else None
+
+
+@async_view(RecipeViewSet.as_view(LIST_ACTIONS, basename='recipes',
+                                  detail=False))
+async def recipe_list(request):
+    if 'cursor' in request.GET:
+        return None
+    queryset = await sync_to_async(filter_recipes)(request)
+    if queryset is None:
+        return None
+    return await paginate(request, queryset, ReadRecipeSerializer)
+
+
+@async_view(RecipeViewSet.as_view(DETAIL_ACTIONS, basename='recipes',
+                                  detail=True))
+async def recipe_detail(request, pk):
+    # query parameters filter the detail view too, leave them to viewset
+    if request.GET:
+        return None
+    try:
+        recipe = await (Recipe.objects.
+                        with_user_flags(request.user).
+                        select_related('author').
+                        prefetch_related('tags', 'portions__ingredient').
+                        aget(pk=pk))
+    except Recipe.DoesNotExist:
+        return None
+    return json_response(
+        await serialize(ReadRecipeSerializer, recipe, request))
+
+
+@async_view(TagViewSet.as_view({'get': 'list'}, basename='tags',
+                               detail=False))
+async def tag_list(request):
+    return await sync_to_async(TagViewSet.snapshot.response)(request)
+
+
+@async_view(TagViewSet.as_view({'get': 'retrieve'}, basename='tags',
+                               detail=True))
+async def tag_detail(request, pk):
+    try:
+        tag = await Tag.objects.aget(pk=pk)
+    except Tag.DoesNotExist:
+        return None
+    return json_response(TagSerializer(tag).data)
+
+
+@async_view(IngredientViewSet.as_view({'get': 'list'},
+                                      basename='ingredients', detail=False))
+async def ingredient_list(request):
+    if not request.GET:
+        return await sync_to_async(
+            IngredientViewSet.snapshot.response)(request)
+    if not request.GET.get('name') or set(request.GET) - {'name', 'limit'}:
+        return None
+    ingredients = await sync_to_async(autocomplete_ingredients)(
+        Ingredient.objects.all(), request.GET['name'],
+        get_ingredient_search_limit(request.GET))
+    return json_response(IngredientSerializer(ingredients, many=True).data)
+
+
+@async_view(IngredientViewSet.as_view({'get': 'retrieve'},
+                                      basename='ingredients', detail=True))
+async def ingredient_detail(request, pk):
+    if request.GET:
+        return None
+    try:
+        ingredient = await Ingredient.objects.aget(pk=pk)
+    except Ingredient.DoesNotExist:
+        return None
+    return json_response(IngredientSerializer(ingredient).data)
+
+
+@async_view(UserViewSet.as_view({'get': 'user_subscriptions'},
+                                basename='users', detail=False))
+async def subscriptions(request):
+    if not request.user.is_authenticated:
+        return None
+    queryset = get_authors_queryset(request.user, request.GET).filter(
+        followers__follower=request.user).order_by('id')
+    return await paginate(request, queryset, SubscriptionSerializer)
+
+
+# Mounted ahead of the router, names are the same for metrics labels
+urlpatterns = [
+    path('recipes/', recipe_list, name='recipes-list'),
+    path('recipes/<int:pk>/', recipe_detail, name='recipes-detail'),
+    path('tags/', tag_list, name='tags-list'),
+    path('tags/<int:pk>/', tag_detail, name='tags-detail'),
+    path('ingredients/', ingredient_list, name='ingredients-list'),
+    path('ingredients/<int:pk>/', ingredient_detail,
+         name='ingredients-detail'),
+    path('users/subscriptions/', subscriptions, name='users-subscriptions'),
+]
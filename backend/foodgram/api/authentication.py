@@ -0,0 +1,150 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api import replicas
+
+
+def shared_key(key):
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def revoked_key(key):
+    return f'auth:revoked:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+class TokenCache:
+    """
+    Token key -> (user, token) in process-local LRU with TTL and,
+    if AUTH_TOKEN_SHARED_CACHE_TTL is set, in the shared cache too.
+
+    Entries are dropped by signals on logout, token deletion and any
+    save of the user (password change, deactivation). Other workers
+    learn it from a revocation mark in the shared cache, which is
+    checked on every local hit: entries cached before the mark are
+    dropped. Marks live as long as local entries, AUTH_TOKEN_CACHE_TTL,
+    and need shared CACHES backend to reach other workers.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+        if entry is not None:
+            _, cached_at, user, token = entry
+            revoked_at = cache.get(revoked_key(key))
+            if revoked_at is None or revoked_at < cached_at:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                return user, token
+            with self._lock:
+                self._entries.pop(key, None)
+        if not settings.AUTH_TOKEN_SHARED_CACHE_TTL:
+            return None
+        entry = cache.get(shared_key(key))
+        if entry is not None:
+            self._set_local(key, *entry)
+        return entry
+
+    def set(self, key, user, token):
+        self._set_local(key, user, token)
+        if settings.AUTH_TOKEN_SHARED_CACHE_TTL:
+            cache.set(shared_key(key), (user, token),
+                      settings.AUTH_TOKEN_SHARED_CACHE_TTL)
+
+    def _set_local(self, key, user, token):
+        if not settings.AUTH_TOKEN_CACHE_TTL:
+            return
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL,
+                time.time(), user, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if settings.AUTH_TOKEN_CACHE_TTL:
+            revoked_at = time.time()
+            cache.set_many({revoked_key(key): revoked_at for key in keys},
+                           settings.AUTH_TOKEN_CACHE_TTL)
+        if settings.AUTH_TOKEN_SHARED_CACHE_TTL:
+            cache.delete_many([shared_key(key) for key in keys])
+
+    def invalidate_user(self, user_id):
+        """Tokens of other workers are found in the database."""
+        with self._lock:
+            keys = {key for key, (_, _, user, _) in self._entries.items()
+                    if user.pk == user_id}
+        keys.update(Token.objects.filter(user_id=user_id).values_list(
+            'key', flat=True))
+        self.invalidate(*keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement of TokenAuthentication, which saves the token
+    and user SELECT on every request. Only active users are cached,
+    read from the primary: a replica may lag behind a revocation.
+    """
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            with replicas.use_primary():
+                cached = super().authenticate_credentials(key)
+            token_cache.set(key, *cached)
+        # every request gets its own copy of cached objects
+        user, token = cached
+        return copy.copy(user), copy.copy(token)
+
+
+async def aauthenticate(request):
+    """
+    Token authentication of async views with the same cache: returns
+    the user, AnonymousUser without credentials or None for bad ones,
+    which are left to sync views to reject with their usual errors.
+    """
+    auth = request.headers.get('Authorization', '').split()
+    keyword = CachedTokenAuthentication.keyword.lower()
+    if not auth or auth[0].lower() != keyword:
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    key = auth[1]
+    cached = token_cache.get(key)
+    if cached is None:
+        token = await (Token.objects.
+                       using(DEFAULT_DB_ALIAS).
+                       select_related('user').
+                       filter(key=key).
+                       afirst())
+        if token is None or not token.user.is_active:
+            return None
+        cached = (token.user, token)
+        token_cache.set(key, *cached)
+    return copy.copy(cached[0])
@@ -0,0 +1,72 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.renderers import JSONRenderer
+
+from api.replicas import use_primary
+
+
+class CatalogSnapshot:
+    """
+    Precomputed JSON of a whole reference catalog (tags, ingredients).
+
+    Snapshot body is kept in process memory together with the catalog
+    version. Version is stored in the shared cache and bumped by signals
+    after commit of any change of catalog rows, so every worker rebuilds
+    its snapshot on the next request after a change and serves it from
+    memory without touching the database otherwise. Snapshots are built from
+    the primary: one from a lagging replica would outlive the change.
+    """
+    def __init__(self, name, get_queryset, serializer_class):
+        self.name = name
+        self.get_queryset = get_queryset
+        self.serializer_class = serializer_class
+        self._lock = threading.Lock()
+        self._version = None
+        self._body = None
+        self._etag = None
+
+    @property
+    def version_key(self):
+        return f'catalog:{self.name}:version'
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is not None:
+            return version
+        cache.add(self.version_key, time.time_ns(), timeout=None)
+        return cache.get(self.version_key)
+
+    def bump_version(self):
+        cache.set(self.version_key, time.time_ns(), timeout=None)
+
+    def _build(self):
+        with use_primary():
+            data = self.serializer_class(self.get_queryset(),
+                                         many=True).data
+        return JSONRenderer().render(data)
+
+    def get(self):
+        """Returns (etag, body) of actual snapshot, rebuilding if stale."""
+        version = self.get_version()
+        with self._lock:
+            if self._version != version or self._body is None:
+                self._body = self._build()
+                digest = hashlib.md5(self._body).hexdigest()
+                self._etag = f'"{self.name}-{digest}"'
+                self._version = version
+            return self._etag, self._body
+
+    def response(self, request):
+        """Full snapshot response or 304 if client has the same ETag."""
+        etag, body = self.get()
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
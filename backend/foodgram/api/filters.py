@@ -1,18 +1,75 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (Case, Count, Exists, IntegerField, OuterRef,
+                              When)
 from django_filters import rest_framework as filters
-from recipes.models import Recipe, Ingredient
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search
+
+from api.replicas import use_primary
+
+
+TAG_IDS_CACHE_KEY = 'catalog:tags:ids-by-slug'
+MIN_CONTAINS_LENGTH = 3
+
+
+def get_tag_ids_by_slug():
+    """
+    Cached {slug: id} map of the small Tag table. Saves clear it,
+    but local caches of other workers only expire, in TAG_IDS_TIMEOUT.
+    """
+    tag_ids = cache.get(TAG_IDS_CACHE_KEY)
+    if tag_ids is None:
+        with use_primary():
+            tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(TAG_IDS_CACHE_KEY, tag_ids, settings.TAG_IDS_TIMEOUT)
+    return tag_ids
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids_by_slug()]
 
 
 class RecipesFilter(filters.FilterSet):
-    """Custom filter for Recipe viewset."""
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    """
+    Custom filter for Recipe viewset.
+    Tags are matched by any (default) or all of given slugs,
+    set by `tags_match` parameter.
+    `search` is full-text search by name and text, ranked by relevance
+    (relevance order is kept with page pagination only).
+    """
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices, method='filter_tags')
+    tags_match = filters.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')), method='filter_tags_match')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
 
+    def filter_tags(self, queryset, name, value):
+        tag_ids_by_slug = get_tag_ids_by_slug()
+        tag_ids = {tag_ids_by_slug[slug] for slug in value}
+        recipe_tags = Recipe.tags.through.objects.filter(tag_id__in=tag_ids)
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            return queryset.filter(id__in=recipe_tags.
+                                   values('recipe_id').
+                                   annotate(matched=Count('tag_id')).
+                                   filter(matched=len(tag_ids)).
+                                   values('recipe_id'))
+        return queryset.filter(Exists(
+            recipe_tags.filter(recipe_id=OuterRef('pk'))))
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search(queryset, value)
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
             return queryset.filter(favorites__user=self.request.user)
@@ -24,10 +81,39 @@ class RecipesFilter(filters.FilterSet):
         return queryset
 
 
+def autocomplete_ingredients(queryset, value, limit):
+    """
+    Up to `limit` ingredients: prefix matches, served by UPPER(name)
+    prefix index, then the rest of matches containing the query.
+    Contains query runs only for 3+ characters, which trigram index
+    can serve, and only if prefix matches don't fill the limit.
+    """
+    found = list(queryset.filter(name__istartswith=value).
+                 order_by('name')[:limit])
+    if len(found) == limit or len(value) < MIN_CONTAINS_LENGTH:
+        return found
+    return found + list(queryset.
+                        filter(name__icontains=value).
+                        exclude(id__in=[item.id for item in found]).
+                        order_by('name')[:limit - len(found)])
+
+
 class IngredientSearchFilter(filters.FilterSet):
-    """Search filter for Ingredients viewset."""
-    name = filters.CharFilter(lookup_expr='istartswith')
+    """
+    Search filter for Ingredients viewset: prefix matches first,
+    then other matches containing the query. List autocomplete goes
+    through `autocomplete_ingredients` with a limit instead.
+    """
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+    def filter_name(self, queryset, name, value):
+        return (queryset.
+                filter(name__icontains=value).
+                annotate(rank=Case(When(name__istartswith=value, then=0),
+                                   default=1,
+                                   output_field=IntegerField())).
+                order_by('rank', 'name'))
@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from recipes.models import Recipe
+
+# Bump to drop all cached fragments when recipe representation changes.
+FRAGMENT_VERSION = 2
+
+# Recipes invalidated by the running bulk change, see invalidate_once
+covered_ids = ContextVar('fragments_covered_ids', default=frozenset())
+
+
+def _key(recipe):
+    """
+    Fragment key includes recipe `updated` time: a change of recipe
+    moves readers to a new key in the same transaction, so a fragment
+    built from rows read before commit is never served afterwards.
+    """
+    return (f'recipe:{recipe.id}:v{FRAGMENT_VERSION}:'
+            f'{recipe.updated.isoformat()}')
+
+
+def get_many(recipes):
+    """Returns {recipe_id: fragment} for cached recipes only."""
+    keys = {_key(recipe): recipe.id for recipe in recipes}
+    return {keys[key]: fragment
+            for key, fragment in cache.get_many(keys).items()}
+
+
+def set_many(fragments):
+    """Caches {recipe: fragment}."""
+    cache.set_many({_key(recipe): fragment
+                    for recipe, fragment in fragments.items()},
+                   timeout=settings.RECIPE_FRAGMENT_TIMEOUT)
+
+
+def invalidate(recipe_ids):
+    """
+    Moves recipes to new fragment keys: for changes of related rows
+    (portions, tags, author), which don't save the recipe itself.
+    Old fragments expire by RECIPE_FRAGMENT_TIMEOUT.
+    """
+    Recipe.objects.filter(id__in=recipe_ids).update(updated=timezone.now())
+
+
+@contextmanager
+def invalidate_once(recipe_ids):
+    """
+    Invalidates recipes once after a bulk change of their related rows;
+    signal receivers skip these recipes inside, see is_covered.
+    """
+    recipe_ids = frozenset(recipe_ids)
+    token = covered_ids.set(covered_ids.get() | recipe_ids)
+    try:
+        yield
+    finally:
+        covered_ids.reset(token)
+    invalidate(recipe_ids)
+
+
+def is_covered(recipe_id):
+    return recipe_id in covered_ids.get()
@@ -0,0 +1,334 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from recipes import synthetic, timeline
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFc'
+         'SJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+
+# Separate cache, so that the run neither reads nor spoils shared one
+BENCHMARK_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'benchmark',
+}}
+
+
+class Scenario:
+    """
+    One route to measure. `path` and `data` are formatted or called with
+    the fixture and the iteration number, so repeats can vary ids.
+    Exceeding `budget` of SQL queries fails the run. `setup` is called
+    with the fixture under scenario settings before the first request.
+    """
+    def __init__(self, name, method, path, budget, data=None,
+                 anonymous=False, settings=None, setup=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.budget = budget
+        self.data = data
+        self.anonymous = anonymous
+        self.settings = settings or {}
+        self.setup = setup
+
+    def get_path(self, fixture, number):
+        if callable(self.path):
+            return self.path(fixture, number)
+        return self.path.format(**fixture)
+
+    def get_data(self, fixture, number):
+        return self.data(fixture, number) if self.data else None
+
+
+def recipe_data(fixture, number):
+    return {
+        'name': f'Рецепт для замера {number}',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': IMAGE,
+        'tags': fixture['tag_ids'][:2],
+        'ingredients': [{'id': ingredient_id, 'amount': 10 + number}
+                        for ingredient_id in fixture['ingredient_ids'][:8]],
+    }
+
+
+def cycle(key, template):
+    """Path with the next item of fixture[key] on every iteration."""
+    def get_path(fixture, number):
+        items = fixture[key]
+        return template.format(items[number % len(items)], **fixture)
+    return get_path
+
+
+SCENARIOS = (
+    Scenario('tags-list', 'get', '/api/tags/', 0),
+    Scenario('ingredients-list', 'get', '/api/ingredients/', 0),
+    Scenario('ingredients-search', 'get',
+             cycle('prefixes', '/api/ingredients/?name={}'), 2),
+    Scenario('recipes-list', 'get',
+             lambda fixture, number: f'/api/recipes/?page={number % 5 + 1}',
+             6),
+    Scenario('recipes-list-anonymous', 'get', '/api/recipes/', 3,
+             anonymous=True),
+    Scenario('recipes-list-cursor', 'get', '/api/recipes/?cursor=', 2),
+    Scenario('recipes-list-filtered', 'get',
+             '/api/recipes/?tags={tag_slug}&is_favorited=1', 3),
+    Scenario('recipes-search', 'get',
+             cycle('words', '/api/recipes/?search={}'), 6),
+    Scenario('recipes-detail', 'get',
+             cycle('recipe_ids', '/api/recipes/{}/'), 5),
+    Scenario('recipes-create', 'post', '/api/recipes/', 19,
+             data=recipe_data),
+    Scenario('recipes-create-fanout', 'post', '/api/recipes/', 19,
+             data=recipe_data, settings={'FEED_FANOUT_ON_WRITE': True}),
+    Scenario('recipes-update', 'patch', '/api/recipes/{own_recipe_id}/', 21,
+             data=recipe_data),
+    Scenario('recipes-feed', 'get', '/api/recipes/feed/', 2),
+    Scenario('recipes-feed-fanout', 'get', '/api/recipes/feed/', 2,
+             settings={'FEED_FANOUT_ON_WRITE': True},
+             setup=lambda fixture: timeline.rebuild()),
+    Scenario('recipes-similar', 'get',
+             cycle('recipe_ids', '/api/recipes/{}/similar/'), 3),
+    Scenario('recipes-cook', 'get',
+             '/api/recipes/cook/?{cook_query}', 2),
+    Scenario('recipes-favorite-add', 'post',
+             cycle('recipe_ids', '/api/recipes/{}/favorite/'), 5),
+    Scenario('recipes-favorite-delete', 'delete',
+             cycle('recipe_ids', '/api/recipes/{}/favorite/'), 5),
+    Scenario('recipes-shopping-cart-batch', 'post',
+             '/api/recipes/shopping_cart/', 3,
+             data=lambda fixture, number: {
+                 'recipes': fixture['recipe_ids'][:50]}),
+    Scenario('shopping-list-download', 'get',
+             '/api/recipes/download_shopping_cart/', 2),
+    Scenario('shopping-list-download-csv', 'get',
+             '/api/recipes/download_shopping_cart/?format=csv', 2),
+    Scenario('users-list', 'get', '/api/users/', 2),
+    Scenario('users-me', 'get', '/api/users/me/', 1),
+    Scenario('users-subscriptions', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', 4),
+    Scenario('users-subscribe', 'post',
+             cycle('author_ids', '/api/users/{}/subscribe/'), 7),
+    Scenario('users-unsubscribe', 'delete',
+             cycle('author_ids', '/api/users/{}/subscribe/'), 8),
+)
+
+
+def feed_scenarios(follows):
+    """Feed of reader following `follows` authors, pulled and fanned out."""
+    return (
+        Scenario(f'recipes-feed-{follows}', 'get',
+                 '/api/recipes/feed/', 2),
+        Scenario(f'recipes-feed-fanout-{follows}', 'get',
+                 '/api/recipes/feed/', 2,
+                 settings={'FEED_FANOUT_ON_WRITE': True},
+                 setup=lambda fixture: timeline.rebuild_for(
+                     fixture['reader'].id)),
+    )
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Seeds a test database with synthetic data and measures '
+            'latency and SQL queries of API routes against query budgets. '
+            'Results can be saved and compared with a previous run. '
+            'E.g. --heavy-cart 150 for shopping list of 150 recipes, '
+            '--catalog-scale 10 for ingredient search in 10x catalog, '
+            '--feed-follows 10,100,1000,10000 to compare both feed modes '
+            'by number of followed authors.')
+
+    def add_arguments(self, parser):
+        synthetic.add_arguments(parser)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', action='append',
+                            help='Scenario name, can be repeated')
+        parser.add_argument(
+            '--feed-follows',
+            help='Comma separated numbers of authors followed by reader, '
+                 'feed is measured for each after other scenarios')
+        parser.add_argument('--output', help='Save results to JSON file')
+        parser.add_argument('--compare', help='JSON file of previous run')
+        parser.add_argument(
+            '--max-slowdown', type=float,
+            help='Fail if p50 grows more than this share against --compare')
+
+    def handle(self, *args, **options):
+        scenarios = [scenario for scenario in SCENARIOS
+                     if not options['only']
+                     or scenario.name in options['only']]
+        try:
+            options['feed_follows'] = [
+                int(follows) for follows in
+                (options['feed_follows'] or '').split(',') if follows]
+        except ValueError:
+            raise CommandError('--feed-follows: числа через запятую')
+        if not scenarios and not options['feed_follows']:
+            raise CommandError('Нет сценариев для замера')
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(MEDIA_ROOT=media_root,
+                                       IMAGE_PROCESSING_WORKERS=0,
+                                       CACHES=BENCHMARK_CACHES):
+                    results = self.run(scenarios, options)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        failed = self.report(results, baseline, options['max_slowdown'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'meta': {
+                        'vendor': connection.vendor,
+                        'python': platform.python_version(),
+                        'options': {name: options[name] for name in (
+                            'users', 'recipes', 'portions', 'favorites',
+                            'carts', 'subscriptions', 'heavy_cart',
+                            'catalog_scale', 'seed', 'repeat')},
+                    },
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2, sort_keys=True)
+        if failed:
+            raise CommandError(f'Не пройдены: {", ".join(failed)}')
+
+    def run(self, scenarios, options):
+        started = time.perf_counter()
+        counts = synthetic.generate_from_options(options)
+        self.stdout.write(
+            'Данные: '
+            + ', '.join(f'{model} {count}' for model, count in counts.items())
+            + f' за {time.perf_counter() - started:.1f} с')
+        fixture = self.get_fixture()
+        results = {scenario.name: self.measure(scenario, fixture, options)
+                   for scenario in scenarios}
+        for follows in options['feed_follows']:
+            synthetic.follow_authors(fixture['reader'], follows)
+            for scenario in feed_scenarios(follows):
+                results[scenario.name] = self.measure(scenario, fixture,
+                                                      options)
+        return results
+
+    def get_fixture(self):
+        """Ids used by scenarios, taken in a deterministic order."""
+        reader = User.objects.order_by('id').first()
+        recipe_ids = list(Recipe.objects.order_by('id').
+                          values_list('id', flat=True)[:200])
+        ingredient_ids = list(Ingredient.objects.order_by('id').
+                              values_list('id', flat=True)[:50])
+        tags = list(Tag.objects.order_by('id'))
+        own_recipe = reader.recipes.order_by('id').first() or (
+            Recipe.objects.create(author=reader, name='Свой рецепт',
+                                  text='Описание', cooking_time=10,
+                                  image=synthetic.IMAGE))
+        names = Ingredient.objects.order_by('id').values_list(
+            'name', flat=True)[:200:10]
+        return {
+            'reader': reader,
+            'token': Token.objects.get_or_create(user=reader)[0].key,
+            'recipe_ids': recipe_ids,
+            'own_recipe_id': own_recipe.id,
+            'author_ids': list(User.objects.exclude(id=reader.id).
+                               exclude(followers__follower=reader).
+                               order_by('id').
+                               values_list('id', flat=True)[:50]),
+            'ingredient_ids': ingredient_ids,
+            'tag_ids': [tag.id for tag in tags],
+            'tag_slug': tags[0].slug,
+            'prefixes': [name[:3] for name in names],
+            'words': [name.split()[0] for name in names],
+            'cook_query': '&'.join(f'ingredients={ingredient_id}'
+                                   for ingredient_id in ingredient_ids[:10]),
+        }
+
+    def measure(self, scenario, fixture, options):
+        client = APIClient()
+        if not scenario.anonymous:
+            client.credentials(HTTP_AUTHORIZATION=f"Token {fixture['token']}")
+        timings, queries, errors = [], [], 0
+        with override_settings(**scenario.settings):
+            if scenario.setup:
+                scenario.setup(fixture)
+            for number in range(options['warmup'] + options['repeat']):
+                with ExitStack() as stack:
+                    # replicas, if set, mirror the test database
+                    contexts = [
+                        stack.enter_context(CaptureQueriesContext(db))
+                        for db in connections.all()]
+                    started = time.perf_counter()
+                    response = getattr(client, scenario.method)(
+                        scenario.get_path(fixture, number),
+                        scenario.get_data(fixture, number), format='json')
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    errors += 1
+                if number >= options['warmup']:
+                    timings.append(elapsed * 1000)
+                    queries.append(sum(len(context.captured_queries)
+                                       for context in contexts))
+        return {
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'queries': max(queries),
+            'budget': scenario.budget,
+            'errors': errors,
+        }
+
+    def report(self, results, baseline, max_slowdown):
+        failed = []
+        self.stdout.write(
+            f"{'Сценарий':<30}{'p50 мс':>9}{'p95 мс':>9}"
+            f"{'Запросы':>9}{'Бюджет':>8}{'Δ p50':>9}  Итог")
+        for name, result in results.items():
+            problems = []
+            if result['queries'] > result['budget']:
+                problems.append('бюджет')
+            if result['errors']:
+                problems.append(f"ошибки {result['errors']}")
+            delta = ''
+            previous = (baseline or {}).get(name)
+            if previous:
+                change = result['p50_ms'] / previous['p50_ms'] - 1
+                delta = f'{change:+.0%}'
+                if max_slowdown is not None and change > max_slowdown:
+                    problems.append('медленнее')
+                if result['queries'] > previous['queries']:
+                    problems.append(
+                        f"запросов было {previous['queries']}")
+            if problems:
+                failed.append(name)
+            self.stdout.write(
+                f"{name:<30}{result['p50_ms']:>9.2f}"
+                f"{result['p95_ms']:>9.2f}{result['queries']:>9}"
+                f"{result['budget']:>8}{delta:>9}  "
+                f"{', '.join(problems) or 'ok'}")
+        return failed
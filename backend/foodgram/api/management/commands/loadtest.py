@@ -0,0 +1,140 @@
+import json
+import statistics
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.management.commands.benchmark import percentile
+
+# Hot read endpoints, served by async views in ASGI_MODE
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?page=2',
+    '/api/tags/',
+    '/api/ingredients/?name=мол',
+)
+SUBSCRIPTIONS_PATH = '/api/users/subscriptions/?recipes_limit=3'
+
+
+class Client(threading.Thread):
+    """Sends requests one by one over `paths` until `deadline`."""
+    def __init__(self, base_url, paths, headers, deadline, offset):
+        super().__init__(daemon=True)
+        self.urls = [base_url + quote(path, safe='/?=&%')
+                     for path in paths]
+        self.headers = headers
+        self.deadline = deadline
+        self.offset = offset
+        self.timings = []
+        self.errors = 0
+
+    def run(self):
+        number = self.offset
+        while time.monotonic() < self.deadline:
+            url = self.urls[number % len(self.urls)]
+            number += 1
+            started = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers=self.headers),
+                             timeout=30) as response:
+                    response.read()
+            except (HTTPError, URLError, OSError):
+                self.errors += 1
+                continue
+            self.timings.append(time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    help = ('Load test of a running server with concurrent clients: '
+            'throughput and latency of read endpoints at every level of '
+            '--concurrency. Compare sync (gunicorn) and ASGI deployment '
+            'by saving one run with --output and passing it to --compare '
+            'of the other, e.g. on data of "generate_data".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument('--path', action='append',
+                            help='Path to request, can be repeated')
+        parser.add_argument('--token', help='Auth token of the clients, '
+                            'also adds subscriptions to default paths')
+        parser.add_argument('--concurrency', default='1,10,50',
+                            help='Comma separated numbers of clients')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds per concurrency level')
+        parser.add_argument('--output', help='Save results to JSON file')
+        parser.add_argument('--compare', help='JSON file of previous run')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level)
+                      for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency: числа через запятую')
+        paths = options['path'] or list(DEFAULT_PATHS)
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f"Token {options['token']}"
+            if not options['path']:
+                paths.append(SUBSCRIPTIONS_PATH)
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+
+        base_url = options['url'].rstrip('/')
+        results = {}
+        for level in levels:
+            results[str(level)] = self.run(base_url, paths, headers, level,
+                                           options['duration'])
+        self.report(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'meta': {'url': base_url, 'paths': paths,
+                             'duration': options['duration']},
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2, sort_keys=True)
+
+    def run(self, base_url, paths, headers, level, duration):
+        started = time.monotonic()
+        clients = [Client(base_url, paths, headers, started + duration,
+                          offset) for offset in range(level)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - started
+        timings = [timing * 1000 for client in clients
+                   for timing in client.timings]
+        errors = sum(client.errors for client in clients)
+        if not timings:
+            raise CommandError(f'Нет успешных ответов от {base_url}, '
+                               f'ошибок: {errors}')
+        return {
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'requests': len(timings),
+            'errors': errors,
+        }
+
+    def report(self, results, baseline):
+        self.stdout.write(
+            f"{'Клиенты':<10}{'RPS':>9}{'p50 мс':>9}{'p95 мс':>9}"
+            f"{'p99 мс':>9}{'Ошибки':>8}{'Δ RPS':>9}{'Δ p95':>9}")
+        for level, result in results.items():
+            delta_rps = delta_p95 = ''
+            previous = (baseline or {}).get(level)
+            if previous:
+                delta_rps = f"{result['rps'] / previous['rps'] - 1:+.0%}"
+                delta_p95 = (
+                    f"{result['p95_ms'] / previous['p95_ms'] - 1:+.0%}")
+            self.stdout.write(
+                f"{level:<10}{result['rps']:>9.1f}{result['p50_ms']:>9.2f}"
+                f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{result['errors']:>8}{delta_rps:>9}{delta_p95:>9}")
@@ -0,0 +1,188 @@
+"""
+Per-request metrics in process memory, served in Prometheus text format.
+
+Requests are labelled by resolved url name (`recipes-list`,
+`users-subscriptions`) and method. Every worker process keeps its own
+numbers, so Prometheus should scrape each worker, or sum over instances.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+METRICS = (
+    ('foodgram_request_duration_seconds', 'Request latency', 'duration',
+     LATENCY_BUCKETS),
+    ('foodgram_request_db_queries', 'SQL queries per request', 'queries',
+     QUERY_BUCKETS),
+    ('foodgram_request_db_duration_seconds', 'SQL time per request',
+     'db_time', DB_TIME_BUCKETS),
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {total}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {total}'
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.responses = {}
+
+    def observe(self, view, method, status, duration, queries, db_time):
+        values = {'duration': duration, 'queries': queries,
+                  'db_time': db_time}
+        with self._lock:
+            histograms = self.histograms.get((view, method))
+            if histograms is None:
+                histograms = self.histograms[(view, method)] = {
+                    key: Histogram(buckets)
+                    for _, _, key, buckets in METRICS}
+            for key, value in values.items():
+                histograms[key].observe(value)
+            key = (view, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for name, description, key, _ in METRICS:
+                lines += [f'# HELP {name} {description}',
+                          f'# TYPE {name} histogram']
+                for (view, method), histograms in sorted(
+                        self.histograms.items()):
+                    lines.extend(histograms[key].lines(
+                        name, f'view="{view}",method="{method}"'))
+            name = 'foodgram_responses_total'
+            lines += [f'# HELP {name} Responses by status code',
+                      f'# TYPE {name} counter']
+            lines.extend(
+                f'{name}{{view="{view}",method="{method}",'
+                f'status="{status}"}} {count}'
+                for (view, method, status), count
+                in sorted(self.responses.items()))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """connection.execute_wrapper counting queries and their time."""
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def wrap_connections(wrapper):
+    """
+    ExitStack with `wrapper` on all DB connections of this thread.
+    Connections are thread-bound, so async code has to enter it
+    via sync_to_async: in the thread, where the ORM runs queries.
+    """
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL queries and SQL time of every request.
+    Streaming responses are measured until their content is consumed.
+    Works in both sync and async chains, so ASGI views stay async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        recorder = QueryRecorder()
+        with wrap_connections(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, started, recorder)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        recorder = QueryRecorder()
+        stack = await sync_to_async(wrap_connections)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, started, recorder)
+
+    def finish(self, request, response, started, recorder):
+        if not response.streaming:
+            self.record(request, response, started, recorder)
+            return response
+        response.streaming_content = self.stream(
+            response.streaming_content, request, response, started, recorder)
+        return response
+
+    def stream(self, content, request, response, started, recorder):
+        try:
+            with wrap_connections(recorder):
+                yield from content
+        finally:
+            self.record(request, response, started, recorder)
+
+    def record(self, request, response, started, recorder):
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unresolved'
+        if view == 'metrics':
+            return
+        registry.observe(view, request.method, response.status_code,
+                         time.perf_counter() - started,
+                         recorder.queries, recorder.db_time)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, open to METRICS_ALLOWED_IPS if set."""
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
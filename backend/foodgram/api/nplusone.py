@@ -0,0 +1,155 @@
+"""
+N+1 query detector: the same SQL shape (literals stripped) repeated
+within one request or block more than NPLUSONE_THRESHOLD times
+is reported with the project stack that issued it.
+
+Modes: 'strict' raises NPlusOneError (for tests), 'log' writes warnings
+(for staging), 'off' skips the middleware altogether.
+"""
+import logging
+import re
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from rest_framework.test import APIClient
+
+from api.metrics import wrap_connections
+
+logger = logging.getLogger(__name__)
+
+NORMALIZERS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+THIS_FILE = str(Path(__file__).resolve())
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """SQL shape: literals as ?, IN lists as (...), single spaces."""
+    for pattern, replacement in NORMALIZERS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def project_stack():
+    """Frames of project code only, without Django and libraries."""
+    base_dir = str(settings.BASE_DIR)
+    return [frame for frame in traceback.extract_stack()[:-2]
+            if frame.filename.startswith(base_dir)
+            and frame.filename != THIS_FILE
+            and 'site-packages' not in frame.filename]
+
+
+class QueryDetector:
+    """connection.execute_wrapper counting statements by their shape."""
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.counts = Counter()
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(IGNORED_PREFIXES):
+            shape = fingerprint(sql)
+            self.counts[shape] += 1
+            # stack is taken once, by the first statement over threshold
+            if self.counts[shape] == self.threshold + 1:
+                self.stacks[shape] = project_stack()
+        return execute(sql, params, many, context)
+
+    @property
+    def problems(self):
+        """[(shape, count, stack)] of repeated statements, worst first."""
+        return [(shape, count, self.stacks[shape])
+                for shape, count in self.counts.most_common()
+                if count > self.threshold]
+
+    def report(self, label=''):
+        lines = [f'N+1 queries {label}'.rstrip()]
+        for shape, count, stack in self.problems:
+            lines.append(f'{count} x {shape}')
+            lines.extend(
+                f'    {frame.filename}:{frame.lineno} in {frame.name}: '
+                f'{frame.line}' for frame in stack)
+        return '\n'.join(lines)
+
+    def check(self, mode='strict', label=''):
+        if not self.problems or mode == 'off':
+            return
+        if mode == 'strict':
+            raise NPlusOneError(self.report(label))
+        logger.warning(self.report(label))
+
+
+@contextmanager
+def detect_n_plus_one(mode='strict', threshold=None, label=''):
+    """
+    Checks statements on all DB connections within the block:
+    with detect_n_plus_one():
+        client.get('/api/recipes/')
+    """
+    detector = QueryDetector(threshold)
+    with wrap_connections(detector):
+        yield detector
+    detector.check(mode, label)
+
+
+class NPlusOneMiddleware:
+    """Checks every request in NPLUSONE_MODE, see settings."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        label = f'in {request.method} {request.path}'
+        with detect_n_plus_one(settings.NPLUSONE_MODE, label=label):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        detector = QueryDetector()
+        stack = await sync_to_async(wrap_connections)(detector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        detector.check(settings.NPLUSONE_MODE,
+                       f'in {request.method} {request.path}')
+        return response
+
+
+class NPlusOneAPIClient(APIClient):
+    """
+    DRF test client failing any request with N+1 queries:
+    client = NPlusOneAPIClient(); client.get('/api/recipes/')
+    Checked request report stays in `last_detector`.
+    """
+    def __init__(self, *args, threshold=None, mode='strict', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.mode = mode
+        self.last_detector = None
+
+    def request(self, **kwargs):
+        label = f"in {kwargs.get('REQUEST_METHOD')} {kwargs.get('PATH_INFO')}"
+        with detect_n_plus_one(self.mode, self.threshold,
+                               label) as detector:
+            self.last_detector = detector
+            return super().request(**kwargs)
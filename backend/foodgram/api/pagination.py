@@ -1,4 +1,10 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
 
 
 class PageLimitPagination(PageNumberPagination):
@@ -7,3 +13,60 @@ class PageLimitPagination(PageNumberPagination):
     """
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset paginator for recipes feed ordered by (-pub_time, -id).
+    Runs no COUNT(*) unless it's asked with `count=true`, in which case
+    the count is cached per filter set for RECIPE_COUNT_TIMEOUT seconds.
+    Empty `cursor` parameter requests the first page.
+    """
+    ordering = ('-pub_time', '-id')
+    page_size_query_param = 'limit'
+    page_size = 6
+    count_query_param = 'count'
+    ignored_count_params = ('cursor', 'limit', 'count')
+
+    def decode_cursor(self, request):
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = self.get_cached_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_cached_count(self, queryset, request):
+        params = sorted(
+            (key, value) for key, value in request.query_params.lists()
+            if key not in self.ignored_count_params)
+        digest = hashlib.md5(
+            f'{request.path}:{request.user.pk}:{params}'.encode()).hexdigest()
+        key = f'recipes:count:{digest}'
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.RECIPE_COUNT_TIMEOUT)
+        return count
+
+    def get_paginated_response(self, data):
+        response = OrderedDict((
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ))
+        if self.count is not None:
+            response['count'] = self.count
+            response.move_to_end('count', last=False)
+        return Response(response)
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """
+    Keyset paginator for subscriptions feed, ordered by `feed_time`
+    annotation: publication time copied to timeline or recipe's own.
+    """
+    ordering = ('-feed_time', '-id')
@@ -0,0 +1,20 @@
+"""
+Pytest fixtures of N+1 detector (on top of pytest-django `db` fixture),
+enabled in conftest.py with: pytest_plugins = ['api.pytest_plugin']
+"""
+import pytest
+
+from api.nplusone import NPlusOneAPIClient, detect_n_plus_one
+
+
+@pytest.fixture
+def n_plus_one(db):
+    """Fails the test on N+1 queries anywhere in its body."""
+    with detect_n_plus_one(label='in test') as detector:
+        yield detector
+
+
+@pytest.fixture
+def n_plus_one_client(db):
+    """DRF test client failing every request with N+1 queries."""
+    return NPlusOneAPIClient()
@@ -0,0 +1,163 @@
+"""
+Read replicas: safe-method requests read from DATABASE_REPLICAS,
+round-robin, everything else and all writes go to the primary.
+
+A replica failing to connect is skipped for REPLICA_RETRY_SECONDS,
+its reads go to the next replica or to the primary. A client, which
+sent POST/PUT/PATCH/DELETE, reads from the primary for the next
+REPLICA_STICKY_SECONDS, so that it sees its own writes despite
+replication lag. Clients are told apart by the Authorization header
+or the session cookie, marks are kept in the shared cache.
+
+Reads outside requests (commands, signals, threads) use the primary.
+"""
+import hashlib
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# replica alias for reads of the current request, None - the primary
+read_alias = ContextVar('read_alias', default=None)
+
+
+class ReplicaPool:
+    """Round-robin over replicas, which are not marked as down."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._down_until = {}
+
+    def healthy(self):
+        now = time.monotonic()
+        with self._lock:
+            return [alias for alias in settings.DATABASE_REPLICAS
+                    if self._down_until.get(alias, 0) <= now]
+
+    def pick(self):
+        aliases = self.healthy()
+        if not aliases:
+            return None
+        return aliases[next(self._counter) % len(aliases)]
+
+    def mark_down(self, alias):
+        with self._lock:
+            self._down_until[alias] = (
+                time.monotonic() + settings.REPLICA_RETRY_SECONDS)
+
+    def check(self, alias):
+        """Connects to replica if needed, marks it down on failure."""
+        connection = connections[alias]
+        if connection.connection is not None:
+            return True
+        try:
+            connection.ensure_connection()
+        except DatabaseError:
+            self.mark_down(alias)
+            return False
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._down_until.clear()
+
+
+pool = ReplicaPool()
+
+
+@contextmanager
+def use_primary():
+    """Reads within the block go to the primary."""
+    token = read_alias.set(None)
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
+
+
+def reading_replica():
+    return read_alias.get() is not None
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS entry: reads as chosen by ReplicaMiddleware."""
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        while alias is not None and not pool.check(alias):
+            alias = pool.pick()
+            read_alias.set(alias)
+        return alias or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+
+def sticky_key(request):
+    credentials = (request.headers.get('Authorization')
+                   or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not credentials:
+        return None
+    digest = hashlib.sha256(credentials.encode()).hexdigest()
+    return f'replicas:sticky:{digest}'
+
+
+class ReplicaMiddleware:
+    """Chooses database of the request reads, see module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = read_alias.set(self.choose(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        self.stick(request)
+        return response
+
+    async def __acall__(self, request):
+        token = read_alias.set(self.choose(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        self.stick(request)
+        return response
+
+    def choose(self, request):
+        if request.method not in SAFE_METHODS:
+            return None
+        key = sticky_key(request)
+        if key and cache.get(key):
+            return None
+        return pool.pick()
+
+    def stick(self, request):
+        """Own writes of the client are read from the primary for a while."""
+        if request.method in SAFE_METHODS:
+            return
+        key = sticky_key(request)
+        if key:
+            cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
@@ -1,12 +1,34 @@
 import base64
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Manager, prefetch_related_objects
 from django.db.transaction import atomic
 from rest_framework import serializers
 
+from api import fragments
+from api.replicas import use_primary
+from recipes.images import schedule_image_processing
 from recipes.models import Recipe, Tag, Ingredient, IngredientPortion
 from users.models import User
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """List of recipe ids for batch favorite / shopping cart requests."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_RECIPES_LIMIT)
+
+
+class CookQuerySerializer(serializers.Serializer):
+    """Ingredient ids user has: ?ingredients=1&ingredients=2."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.COOK_INGREDIENTS_LIMIT)
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     """Serializer for Ingredient viewset."""
     class Meta:
@@ -14,13 +36,35 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
 
 
+def media_url(path, request):
+    url = default_storage.url(path)
+    return url if request is None else request.build_absolute_uri(url)
+
+
+def variant_urls(variants, request):
+    return {size_name: {image_format: media_url(path, request)
+                        for image_format, path in formats.items()}
+            for size_name, formats in variants.items()}
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    URLs of resized recipe image copies: {size: {format: url}}.
+    Empty until background processing of uploaded image is done.
+    """
+    def to_representation(self, variants):
+        return variant_urls(variants, self.context.get('request'))
+
+
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """
     Additional serializer for Recipes with short list of fields.
     Used for Subscriptions, Favorite Recipes and Shopping Cart.
     """
+    image_variants = ImageVariantsField()
+
     class Meta:
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         model = Recipe
 
 
@@ -32,13 +76,26 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
-    """Custom serializer field for recipe image."""
+    """
+    Custom serializer field for recipe image.
+    Payload size is checked before decoding, dimensions - from image header.
+    """
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
+            if len(imgstr) * 3 // 4 > settings.MAX_IMAGE_UPLOAD_SIZE:
+                raise serializers.ValidationError(
+                    'Размер картинки не должен превышать '
+                    f'{settings.MAX_IMAGE_UPLOAD_SIZE // 1024 // 1024} Мб.')
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        image_file = super().to_internal_value(data)
+        image = getattr(image_file, 'image', None)
+        if image and max(image.size) > settings.MAX_IMAGE_DIMENSION:
+            raise serializers.ValidationError(
+                'Размер картинки не должен превышать '
+                f'{settings.MAX_IMAGE_DIMENSION} пикселей по стороне.')
+        return image_file
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -51,6 +108,8 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return user.is_authenticated and user.follows.filter(
             author=obj).exists()
@@ -59,7 +118,6 @@ class UserSerializer(serializers.ModelSerializer):
 class SubscriptionSerializer(UserSerializer):
     """Serializer for User's Subscriptions. Based on User serializer."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
@@ -67,15 +125,15 @@ class SubscriptionSerializer(UserSerializer):
             'email', 'id', 'username', 'last_name', 'first_name')
 
     def get_recipes(self, user):
-        recipes = user.recipes.all()
-        limit = self.context['request'].GET.get('recipes_limit')
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(user, 'recipes_preview'):
+            recipes = user.recipes_preview
+        else:
+            recipes = user.recipes.all()
+            limit = self.context['request'].GET.get('recipes_limit')
+            if limit:
+                recipes = recipes[:int(limit)]
         return ShortRecipeSerializer(recipes, many=True, read_only=True).data
 
-    def get_recipes_count(self, user):
-        return user.recipes.count()
-
     def validate(self, attrs):
         user = self.context['request'].user
         author = self.context['author']
@@ -96,6 +154,32 @@ class ReadIngredientPortionSerializer(serializers.ModelSerializer):
         model = IngredientPortion
 
 
+class CachedRecipeListSerializer(serializers.ListSerializer):
+    """
+    List serializer for recipes assembled from cached per-recipe fragments.
+    Fragments are viewer-independent: they are fetched with one get_many
+    call, only misses are serialized, and viewer-specific flags are
+    applied to every item afterwards. Relations of misses are read from
+    the primary, so a fragment is never older than its key, even if
+    the page came from a lagging replica.
+    """
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        cached = fragments.get_many(recipes)
+        misses = [recipe for recipe in recipes if recipe.id not in cached]
+        if misses:
+            with use_primary():
+                prefetch_related_objects(misses, 'tags',
+                                         'portions__ingredient')
+            fresh = {recipe: self.child.to_fragment(recipe)
+                     for recipe in misses}
+            fragments.set_many(fresh)
+            cached.update((recipe.id, fragment)
+                          for recipe, fragment in fresh.items())
+        return [self.child.apply_user_flags(cached[recipe.id], recipe)
+                for recipe in recipes]
+
+
 class ReadRecipeSerializer(serializers.ModelSerializer):
     """Serializer for Recipe requests with safe methods."""
     tags = TagSerializer(read_only=True, many=True)
@@ -103,28 +187,67 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
     ingredients = ReadIngredientPortionSerializer(many=True, source='portions')
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
-    image = Base64ImageField()
+    # storage paths in cached fragments, URLs are built per request
+    image = serializers.ImageField(use_url=False)
+    image_variants = serializers.ReadOnlyField()
 
     class Meta:
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_variants', 'text', 'cooking_time',
+                  'favorites_count')
         model = Recipe
+        list_serializer_class = CachedRecipeListSerializer
+
+    def to_representation(self, recipe):
+        return self.apply_user_flags(self.to_fragment(recipe), recipe)
+
+    def to_fragment(self, recipe):
+        """Representation cached for every viewer and host."""
+        if hasattr(recipe, 'author_is_subscribed'):
+            recipe.author.is_subscribed = recipe.author_is_subscribed
+        return super().to_representation(recipe)
+
+    def apply_user_flags(self, data, recipe):
+        """
+        Overlays viewer-specific flags, frequently changing counters
+        and image URLs of request host on cached recipe representation.
+        """
+        if hasattr(recipe, 'author_is_subscribed'):
+            recipe.author.is_subscribed = recipe.author_is_subscribed
+        request = self.context.get('request')
+        if data['image']:
+            data['image'] = media_url(data['image'], request)
+        data['image_variants'] = variant_urls(data['image_variants'],
+                                              request)
+        data['favorites_count'] = recipe.favorites_count
+        data['is_favorited'] = self.get_is_favorited(recipe)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(recipe)
+        data['author']['is_subscribed'] = (
+            self.fields['author'].get_is_subscribed(recipe.author))
+        return data
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context['request'].user
         return user.is_authenticated and user.favorites.filter(
             recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context['request'].user
         return user.is_authenticated and user.carts.filter(
             recipe=recipe).exists()
 
 
 class WriteIngredientPortionSerializer(serializers.ModelSerializer):
-    """IngredientPortion nested field for Recipe requests w/ unsafe methods."""
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    """
+    IngredientPortion nested field for Recipe requests w/ unsafe methods.
+    Ingredient ids are checked by parent serializer in one query.
+    """
+    id = serializers.IntegerField()
 
     class Meta:
         fields = ('id', 'amount')
@@ -134,8 +257,7 @@ class WriteIngredientPortionSerializer(serializers.ModelSerializer):
 class WriteRecipeSerializer(serializers.ModelSerializer):
     """Serializer for Recipe requests with unsafe methods."""
     ingredients = WriteIngredientPortionSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField(required=True)
 
     class Meta:
@@ -153,14 +275,56 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Теги не должны повторяться.')
         return attrs
 
-    def _add_ingredients_and_tags(self, ingredients, tags, recipe):
-        recipe.tags.set(tags)
+    def validate_tags(self, tags):
+        found = set(Tag.objects.filter(id__in=tags).
+                    values_list('id', flat=True))
+        missing = [tag for tag in tags if tag not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {missing}.')
+        return tags
+
+    def validate_ingredients(self, ingredients):
+        ids = [ingredient['id'] for ingredient in ingredients]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться.')
+        found = set(Ingredient.objects.filter(id__in=ids).
+                    values_list('id', flat=True))
+        missing = [id for id in ids if id not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {missing}.')
+        return ingredients
+
+    def _set_ingredients(self, ingredients, recipe, created=False):
+        """
+        Saves recipe portions as a diff against existing ones:
+        only new portions are inserted, changed - updated, removed - deleted.
+        """
+        amounts = {ingredient['id']: ingredient['amount']
+                   for ingredient in ingredients}
+        existing = ({} if created else
+                    {portion.ingredient_id: portion
+                     for portion in recipe.portions.all()})
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            with fragments.invalidate_once([recipe.id]):
+                recipe.portions.filter(ingredient_id__in=removed).delete()
+        changed = []
+        for ingredient_id, portion in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and portion.amount != amount:
+                portion.amount = amount
+                changed.append(portion)
+        if changed:
+            IngredientPortion.objects.bulk_update(changed, ('amount',))
         IngredientPortion.objects.bulk_create([IngredientPortion(
             recipe=recipe,
-            ingredient=ingredient['id'],
-            amount=ingredient['amount'],
-        ) for ingredient in ingredients])
-        return recipe
+            ingredient_id=ingredient_id,
+            amount=amount,
+        ) for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing])
 
     @atomic
     def create(self, validated_data):
@@ -168,18 +332,27 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=user, **validated_data)
-        self._add_ingredients_and_tags(ingredients, tags, recipe)
+        recipe.tags.add(*tags)
+        self._set_ingredients(ingredients, recipe, created=True)
+        schedule_image_processing(recipe.id)
         return recipe
 
     @atomic
     def update(self, recipe, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe.tags.clear()
-        recipe.ingredients.clear()
-        self._add_ingredients_and_tags(ingredients, tags, recipe)
+        recipe.tags.set(tags)
+        self._set_ingredients(ingredients, recipe)
+        if 'image' in validated_data:
+            schedule_image_processing(recipe.id)
         return super().update(recipe, validated_data)
 
     def to_representation(self, instance):
-        context = {'request': self.context['request']}
-        return ReadRecipeSerializer(instance, context=context).data
+        request = self.context['request']
+        instance = (Recipe.objects.
+                    with_user_flags(request.user).
+                    select_related('author').
+                    prefetch_related('tags', 'portions__ingredient').
+                    get(id=instance.id))
+        return ReadRecipeSerializer(
+            instance, context={'request': request}).data
@@ -0,0 +1,101 @@
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api import fragments
+from api.authentication import token_cache
+from api.filters import TAG_IDS_CACHE_KEY
+from api.views import IngredientViewSet, TagViewSet
+from recipes.models import Ingredient, IngredientPortion, Recipe, Tag
+from users.models import User
+
+USER_PUBLIC_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+def invalidate_recipes(recipe_ids):
+    # in the same transaction as the change, see fragments._key
+    fragments.invalidate(list(recipe_ids))
+
+
+def bump_tags():
+    TagViewSet.snapshot.bump_version()
+    cache.delete(TAG_IDS_CACHE_KEY)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_catalog(sender, **kwargs):
+    # after commit: a snapshot built before it would get the new version
+    transaction.on_commit(bump_tags)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_catalog(sender, **kwargs):
+    transaction.on_commit(IngredientViewSet.snapshot.bump_version)
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def invalidate_tag_recipes(sender, instance, **kwargs):
+    invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def invalidate_ingredient_recipes(sender, instance, **kwargs):
+    invalidate_recipes(
+        instance.portions.values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, created, update_fields,
+                              **kwargs):
+    if created or (update_fields and USER_PUBLIC_FIELDS.isdisjoint(
+            update_fields)):
+        return
+    invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe(sender, instance, update_fields, **kwargs):
+    """Saves set `updated` themselves, unless it's left out."""
+    if update_fields is not None and 'updated' not in update_fields:
+        invalidate_recipes([instance.id])
+
+
+@receiver((post_save, post_delete), sender=IngredientPortion)
+def invalidate_portion_recipe(sender, instance, **kwargs):
+    if not fragments.is_covered(instance.recipe_id):
+        invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        invalidate_recipes(pk_set or ())
+    else:
+        invalidate_recipes([instance.id])
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Token deletion: djoser logout, admin or user deletion."""
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.invalidate(key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Password change, deactivation or profile change of cached user."""
+    user_id = instance.pk
+    transaction.on_commit(lambda: token_cache.invalidate_user(user_id))
+
+
+@receiver(user_logged_out)
+def invalidate_logged_out(sender, user, **kwargs):
+    if user is not None:
+        token_cache.invalidate_user(user.pk)
@@ -0,0 +1,36 @@
+from recipes.models import Ingredient, IngredientPortion, Recipe, Tag
+from users.models import User
+
+IMAGE = 'recipes/images/test.png'
+IMAGE_DATA = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAf'
+              'FcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com', username=f'user{number}',
+        first_name='Имя', last_name='Фамилия', password='password')
+
+
+def create_tags(count=3):
+    return Tag.objects.bulk_create([
+        Tag(name=f'Тег {number}', color=f'#00000{number}',
+            slug=f'tag{number}')
+        for number in range(count)])
+
+
+def create_ingredients(count=10):
+    return Ingredient.objects.bulk_create([
+        Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+        for number in range(count)])
+
+
+def create_recipe(author, tags=(), ingredients=(), name='Рецепт'):
+    recipe = Recipe.objects.create(author=author, name=name, text='Текст',
+                                   cooking_time=10, image=IMAGE)
+    recipe.tags.set(tags)
+    IngredientPortion.objects.bulk_create([
+        IngredientPortion(recipe=recipe, ingredient=ingredient,
+                          amount=number + 1)
+        for number, ingredient in enumerate(ingredients)])
+    return recipe
@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import TokenCache, token_cache
+from api.tests.factories import create_user
+
+
+# workers of a test share one process and its local memory cache
+@override_settings(AUTH_TOKEN_CACHE_TTL=30)
+class TokenRevocationTest(TestCase):
+    """Token revoked in one worker is not accepted by the others."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_revocation_reaches_other_worker(self):
+        worker, other_worker = TokenCache(), TokenCache()
+        worker.set(self.token.key, self.user, self.token)
+        other_worker.invalidate(self.token.key)
+        self.assertIsNone(worker.get(self.token.key))
+        # cached again after revocation - valid
+        worker.set(self.token.key, self.user, self.token)
+        self.assertEqual(worker.get(self.token.key),
+                         (self.user, self.token))
+
+    def test_deleted_token_is_rejected(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        # deleted by another worker: this one only sees the shared mark
+        Token.objects.filter(key=self.token.key).delete()
+        TokenCache().invalidate(self.token.key)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_user_save_revokes_tokens_of_other_workers(self):
+        worker = TokenCache()
+        worker.set(self.token.key, self.user, self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertIsNone(worker.get(self.token.key))
@@ -0,0 +1,38 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from recipes.models import Ingredient, Tag
+
+from api.views import IngredientViewSet, TagViewSet
+
+
+class CatalogVersionTest(TestCase):
+    """Snapshots built before a change commits don't outlive it."""
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_bumped_after_commit(self, snapshot, create):
+        version = snapshot.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            create()
+            self.assertEqual(snapshot.get_version(), version)
+            # rebuilt by a concurrent request before commit
+            snapshot.get()
+        self.assertNotEqual(snapshot.get_version(), version)
+        return [item['name'] for item in json.loads(snapshot.get()[1])]
+
+    def test_tags(self):
+        names = self.assert_bumped_after_commit(
+            TagViewSet.snapshot,
+            lambda: Tag.objects.create(name='Тег', color='#000000',
+                                       slug='tag'))
+        self.assertEqual(names, ['Тег'])
+
+    def test_ingredients(self):
+        names = self.assert_bumped_after_commit(
+            IngredientViewSet.snapshot,
+            lambda: Ingredient.objects.create(name='соль',
+                                              measurement_unit='г'))
+        self.assertEqual(names, ['соль'])
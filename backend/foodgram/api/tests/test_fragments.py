@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.test import TestCase
+from recipes.models import Recipe
+from rest_framework.test import APIClient
+
+from api import fragments
+from api.tests.factories import (create_ingredients, create_recipe,
+                                 create_tags, create_user)
+
+
+class RecipeFragmentsTest(TestCase):
+    """Cached recipe fragments don't leak hosts or outlive changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipe(create_user(1), create_tags(),
+                                   create_ingredients()[:2])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_image_urls_use_host_of_request(self):
+        Recipe.objects.filter(id=self.recipe.id).update(image_variants={
+            'small': {'WEBP': 'recipes/images/test_small.webp'}})
+        for host in ('first.example.com', 'second.example.com'):
+            with self.subTest(host=host):
+                response = self.client.get('/api/recipes/', HTTP_HOST=host)
+                recipe = response.data['results'][0]
+                self.assertTrue(recipe['image'].startswith(f'http://{host}/'))
+                self.assertTrue(recipe['image_variants']['small']['WEBP'].
+                                startswith(f'http://{host}/'))
+
+    def test_fragment_built_before_change_is_not_served(self):
+        stale = Recipe.objects.get(id=self.recipe.id)
+        self.client.get('/api/recipes/')
+        Recipe.objects.filter(id=self.recipe.id).update(name='Новое имя')
+        # the change touches recipe before a concurrent miss caches it
+        fragments.invalidate([self.recipe.id])
+        fragments.set_many({stale: {'name': 'Рецепт'}})
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.data['results'][0]['name'], 'Новое имя')
+
+    def test_portion_change_moves_fragment_key(self):
+        self.client.get('/api/recipes/')
+        portion = self.recipe.portions.first()
+        portion.amount = 500
+        portion.save()
+        response = self.client.get('/api/recipes/')
+        ingredients = response.data['results'][0]['ingredients']
+        amounts = [ingredient['amount'] for ingredient in ingredients]
+        self.assertIn(500, amounts)
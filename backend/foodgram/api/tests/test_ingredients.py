@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from recipes.models import Ingredient
+from rest_framework.test import APIClient
+
+
+@override_settings(INGREDIENT_SEARCH_LIMIT=10)
+class IngredientAutocompleteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('сахар', 'сахарная пудра', 'сахарин', 'сахароза',
+                         'тростниковый сахар', 'ванильный сахар', 'соль')])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def names(self, path):
+        return [item['name'] for item in self.client.get(path).data]
+
+    def test_prefix_matches_first(self):
+        with self.assertNumQueries(2):
+            names = self.names('/api/ingredients/?name=сахар&limit=6')
+        self.assertEqual(names[:4], ['сахар', 'сахарин', 'сахарная пудра',
+                                     'сахароза'])
+        self.assertEqual(set(names[4:]), {'тростниковый сахар',
+                                          'ванильный сахар'})
+
+    def test_limit_filled_by_prefix_matches_skips_contains_query(self):
+        with self.assertNumQueries(1):
+            names = self.names('/api/ingredients/?name=сах&limit=3')
+        self.assertEqual(names, ['сахар', 'сахарин', 'сахарная пудра'])
+
+    def test_short_query_matches_prefix_only(self):
+        with self.assertNumQueries(1):
+            names = self.names('/api/ingredients/?name=со&limit=3')
+        self.assertEqual(names, ['соль'])
@@ -0,0 +1,36 @@
+import pytest
+from django.core.cache import cache
+from recipes.models import Recipe
+
+from api.nplusone import NPlusOneError, detect_n_plus_one
+from api.tests.factories import (create_ingredients, create_recipe,
+                                 create_tags, create_user)
+
+
+@pytest.fixture
+def recipes(db):
+    # recipe fragments would hide queries of serialization
+    cache.clear()
+    tags = create_tags()
+    ingredients = create_ingredients()
+    return [create_recipe(create_user(number), tags, ingredients[:3])
+            for number in range(10)]
+
+
+def test_strict_mode_raises_on_per_object_queries(recipes):
+    with pytest.raises(NPlusOneError, match='users_user'):
+        with detect_n_plus_one(threshold=5):
+            for recipe in Recipe.objects.all():
+                recipe.author.username
+
+
+def test_select_related_passes(recipes, n_plus_one):
+    for recipe in Recipe.objects.select_related('author'):
+        recipe.author.username
+
+
+def test_recipe_list_passes(recipes, n_plus_one_client):
+    response = n_plus_one_client.get('/api/recipes/?limit=10')
+    assert response.status_code == 200
+    assert len(response.data['results']) == 10
+    assert n_plus_one_client.last_detector.problems == []
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase
+from recipes.models import Cart, Favorite
+from rest_framework.test import APIClient
+from users.models import Subscription
+
+from api.tests.factories import (create_ingredients, create_recipe,
+                                 create_tags, create_user)
+
+
+class RecipeReadQueriesTest(TestCase):
+    """List and retrieve cost fixed number of queries for any page size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user(0)
+        authors = [create_user(number) for number in range(1, 4)]
+        tags = create_tags()
+        ingredients = create_ingredients()
+        cls.recipes = [
+            create_recipe(authors[number % 3], tags[:number % 3 + 1],
+                          ingredients[number % 5:number % 5 + 4],
+                          name=f'Рецепт {number}')
+            for number in range(12)]
+        Subscription.objects.create(follower=cls.reader, author=authors[0])
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        Cart.objects.create(user=cls.reader, recipe=cls.recipes[1])
+
+    def setUp(self):
+        # recipe fragments would hide queries of serialization
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        for client in (self.client, self.anonymous):
+            for limit in (2, 6, 12):
+                cache.clear()
+                path = f'/api/recipes/?limit={limit}'
+                with self.subTest(limit=limit, client=client):
+                    # COUNT, page with flags; tags, portions and
+                    # ingredients of fragment cache misses
+                    with self.assertNumQueries(5):
+                        response = client.get(path)
+                    self.assertEqual(len(response.data['results']), limit)
+                    with self.assertNumQueries(2):
+                        client.get(path)
+
+    def test_list_flags(self):
+        response = self.client.get('/api/recipes/?limit=12')
+        recipes = {recipe['id']: recipe for recipe in response.data['results']}
+        favorite = recipes[self.recipes[0].id]
+        in_cart = recipes[self.recipes[1].id]
+        self.assertTrue(favorite['is_favorited'])
+        self.assertTrue(favorite['author']['is_subscribed'])
+        self.assertTrue(in_cart['is_in_shopping_cart'])
+        self.assertFalse(in_cart['is_favorited'])
+        self.assertFalse(in_cart['author']['is_subscribed'])
+
+    def test_retrieve_queries_are_fixed(self):
+        # recipe with flags, tags, portions, their ingredients
+        for recipe in self.recipes[:4]:
+            with self.subTest(recipe=recipe.id):
+                with self.assertNumQueries(4):
+                    response = self.client.get(f'/api/recipes/{recipe.id}/')
+                self.assertEqual(response.data['id'], recipe.id)
@@ -0,0 +1,108 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.tests.factories import (IMAGE_DATA, create_ingredients, create_tags,
+                                 create_user)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeWriteQueriesTest(TestCase):
+    """Writes cost fixed number of queries for any number of ingredients."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(1)
+        cls.tags = create_tags()
+        cls.ingredients = create_ingredients(30)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def get_data(self, ingredients, amount=10):
+        return {
+            'name': 'Рецепт',
+            'text': 'Текст',
+            'cooking_time': 10,
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [{'id': ingredient.id, 'amount': amount}
+                            for ingredient in ingredients],
+        }
+
+    def create(self, count):
+        data = self.get_data(self.ingredients[:count])
+        data['image'] = IMAGE_DATA
+        return self.client.post('/api/recipes/', data, format='json')
+
+    def test_create(self):
+        for count in (5, 20):
+            with self.subTest(ingredients=count):
+                # id checks with IN, bulk inserts, reload of response
+                with self.assertNumQueries(14):
+                    response = self.create(count)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.data['ingredients']), count)
+
+    def test_noop_update_writes_no_portions(self):
+        for count in (5, 20):
+            recipe_id = self.create(count).data['id']
+            with self.subTest(ingredients=count):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.patch(
+                        f'/api/recipes/{recipe_id}/',
+                        self.get_data(self.ingredients[:count]),
+                        format='json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(context.captured_queries), 14)
+                portion_writes = [
+                    query['sql'] for query in context.captured_queries
+                    if 'recipes_ingredientportion' in query['sql']
+                    and not query['sql'].startswith('SELECT')]
+                self.assertEqual(portion_writes, [])
+
+    def test_partial_update(self):
+        for count in (5, 20):
+            recipe_id = self.create(count).data['id']
+            # one portion removed, one added, the rest change amount
+            ingredients = self.ingredients[1:count + 1]
+            with self.subTest(ingredients=count):
+                with self.assertNumQueries(19):
+                    response = self.client.patch(
+                        f'/api/recipes/{recipe_id}/',
+                        self.get_data(ingredients, amount=11),
+                        format='json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    {(item['id'], item['amount'])
+                     for item in response.data['ingredients']},
+                    {(ingredient.id, 11) for ingredient in ingredients})
+
+    def test_removed_portions_update_recipe_once(self):
+        for removed in (1, 10):
+            recipe_id = self.create(20).data['id']
+            with self.subTest(removed=removed):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.patch(
+                        f'/api/recipes/{recipe_id}/',
+                        self.get_data(self.ingredients[removed:20]),
+                        format='json')
+                self.assertEqual(response.status_code, 200)
+                # fragment invalidation and the save of recipe itself
+                recipe_updates = [
+                    query['sql'] for query in context.captured_queries
+                    if query['sql'].startswith('UPDATE "recipes_recipe"')]
+                self.assertEqual(len(recipe_updates), 2)
@@ -0,0 +1,84 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from recipes.models import Cart, Favorite
+from rest_framework.test import APIClient
+
+from api.tests.factories import create_recipe, create_user
+
+THREADS = 8
+
+
+class ConcurrentRelationsTest(TransactionTestCase):
+    """Concurrent adds of the same recipe create exactly one relation."""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('in-memory SQLite locks tables of concurrent '
+                          'writers instead of waiting')
+        self.user = create_user(1)
+        self.recipe = create_recipe(create_user(2))
+
+    def post_concurrently(self, path):
+        barrier = threading.Barrier(THREADS)
+
+        def post(_):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                return client.post(path).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(THREADS) as executor:
+            return sorted(executor.map(post, range(THREADS)))
+
+    def test_single_add(self):
+        for model, action in ((Favorite, 'favorite'),
+                              (Cart, 'shopping_cart')):
+            with self.subTest(action=action):
+                statuses = self.post_concurrently(
+                    f'/api/recipes/{self.recipe.id}/{action}/')
+                self.assertEqual(statuses, [201] + [400] * (THREADS - 1))
+                self.assertEqual(model.objects.filter(
+                    user=self.user, recipe=self.recipe).count(), 1)
+
+    def test_favorites_count(self):
+        self.post_concurrently(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+
+class BatchRelationsTest(TestCase):
+    """Batch add and delete keep recipe counters exact."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        author = create_user(2)
+        cls.recipes = [create_recipe(author) for _ in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_counters(self):
+        ids = [recipe.id for recipe in self.recipes]
+        missing_id = max(ids) + 1
+        for method, count in (('post', 1), ('delete', 0)):
+            with self.subTest(method=method):
+                response = getattr(self.client, method)(
+                    '/api/recipes/favorite/', {'recipes': ids + [missing_id]},
+                    format='json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['results'][-1]['status'],
+                                 'not_found')
+                self.assertEqual(
+                    Favorite.objects.filter(user=self.user).count(),
+                    count * len(ids))
+                for recipe in self.recipes:
+                    recipe.refresh_from_db()
+                    self.assertEqual(recipe.favorites_count, count)
@@ -0,0 +1,60 @@
+import json
+
+from django.test import TestCase
+from recipes.models import Cart, Favorite, IngredientPortion
+from rest_framework.test import APIClient
+
+from api.tests.factories import create_ingredients, create_recipe, create_user
+
+
+class ShoppingListTest(TestCase):
+    """Totals are sums over portions of cart recipes, counted once each."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        other = create_user(2)
+        cls.ingredients = create_ingredients(4)
+        first, second, third = cls.ingredients[:3]
+        soup = create_recipe(other, name='Суп')
+        salad = create_recipe(other, name='Салат')
+        skipped = create_recipe(other, name='Не в корзине')
+        IngredientPortion.objects.bulk_create([
+            IngredientPortion(recipe=soup, ingredient=first, amount=100),
+            IngredientPortion(recipe=soup, ingredient=first, amount=50),
+            IngredientPortion(recipe=soup, ingredient=second, amount=2),
+            IngredientPortion(recipe=soup, ingredient=third, amount=7),
+            IngredientPortion(recipe=salad, ingredient=first, amount=30),
+            IngredientPortion(recipe=salad, ingredient=second, amount=1),
+            IngredientPortion(recipe=skipped, ingredient=first, amount=1000),
+        ])
+        for recipe in (soup, salad):
+            Cart.objects.create(user=cls.user, recipe=recipe)
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        Cart.objects.create(user=other, recipe=soup)
+        Cart.objects.create(user=other, recipe=skipped)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, file_format):
+        response = self.client.get(
+            f'/api/recipes/download_shopping_cart/?format={file_format}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_amounts_are_summed_once(self):
+        first, second, third = self.ingredients[:3]
+        self.assertEqual(
+            {item['id']: item['amount']
+             for item in json.loads(self.download('json'))},
+            {first.id: 180, second.id: 3, third.id: 7})
+
+    def test_formats_have_same_totals(self):
+        text = self.download('txt')
+        self.assertIn(f' - {self.ingredients[0].name} (г): 180', text)
+        rows = self.download('csv').splitlines()
+        self.assertEqual(rows[0], 'name,measurement_unit,amount')
+        self.assertEqual(len(rows), 4)
+        self.assertIn(f'{self.ingredients[2].name},г,7', rows)
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Recipe
+from rest_framework.test import APIClient
+
+from api.tests.factories import create_recipe, create_tags, create_user
+
+
+class TagFilterTest(TestCase):
+    """Tag filter returns every recipe once, with the same queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user(1)
+        cls.tags = create_tags()
+        # recipe number is a bit mask of its tags
+        cls.recipes = [
+            create_recipe(author, [tag for bit, tag in enumerate(cls.tags)
+                                   if number & 1 << bit],
+                          name=f'Рецепт {number}')
+            for number in range(8)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get_ids(self, tags, match):
+        query = '&'.join(f'tags={tag.slug}' for tag in tags)
+        response = self.client.get(
+            f'/api/recipes/?{query}&tags_match={match}&limit=20')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def expected_ids(self, tags, match):
+        mask = sum(1 << self.tags.index(tag) for tag in tags)
+        return {recipe.id for number, recipe in enumerate(self.recipes)
+                if (number & mask == mask if match == 'all'
+                    else number & mask)}
+
+    def test_recipes_are_not_duplicated(self):
+        for match in ('any', 'all'):
+            for count in (1, 2, 3):
+                tags = self.tags[:count]
+                with self.subTest(match=match, tags=count):
+                    ids = self.get_ids(tags, match)
+                    self.assertEqual(len(ids), len(set(ids)))
+                    self.assertEqual(set(ids),
+                                     self.expected_ids(tags, match))
+
+    def test_query_plan_does_not_depend_on_tags(self):
+        through = Recipe.tags.through._meta.db_table
+        for match in ('any', 'all'):
+            counts = set()
+            for count in (1, 2, 3):
+                with self.subTest(match=match, tags=count):
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as context:
+                        self.get_ids(self.tags[:count], match)
+                    counts.add(len(context.captured_queries))
+                    recipe_queries = [
+                        query['sql'] for query in context.captured_queries
+                        if 'FROM "recipes_recipe" ' in query['sql']]
+                    # COUNT and page, tags are matched in a subquery
+                    self.assertEqual(len(recipe_queries), 2)
+                    for sql in recipe_queries:
+                        self.assertNotIn('DISTINCT', sql)
+                        self.assertNotIn(f'JOIN "{through}"', sql)
+            self.assertEqual(len(counts), 1)
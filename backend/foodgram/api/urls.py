@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
+from api import async_views
 from api.views import UserViewSet, IngredientViewSet, TagViewSet, RecipeViewSet
 
 
@@ -16,3 +18,6 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASGI_MODE:
+    urlpatterns = async_views.urlpatterns + urlpatterns
@@ -1,23 +1,58 @@
 from django.conf import settings
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
+from recipes import similarity
+from recipes.counters import recount
 from recipes.models import Cart, Favorite, Ingredient, Recipe, Tag
+from recipes.shopping_list import FORMATS
 from rest_framework import filters, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from api.filters import IngredientSearchFilter, RecipesFilter
-from api.pagination import PageLimitPagination
+from api.catalog import CatalogSnapshot
+from api.filters import (IngredientSearchFilter, RecipesFilter,
+                         autocomplete_ingredients, get_tag_ids_by_slug)
+from api.pagination import (FeedCursorPagination, PageLimitPagination,
+                            RecipeCursorPagination)
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (IngredientSerializer, ReadRecipeSerializer,
+from api.renderers import CSVRenderer, PlainTextRenderer
+from api.serializers import (CookQuerySerializer, IngredientSerializer,
+                             ReadRecipeSerializer, RecipeIdsSerializer,
                              ShortRecipeSerializer, SubscriptionSerializer,
                              TagSerializer, WriteRecipeSerializer)
 from users.models import Subscription, User
 
 
+def get_authors_queryset(user, query_params):
+    """Authors with annotated counters and limited recipes preview."""
+    recipes_limit = query_params.get('recipes_limit')
+    try:
+        recipes_limit = max(int(recipes_limit), 0)
+    except (TypeError, ValueError):
+        recipes_limit = None
+    return (User.objects.
+            with_is_subscribed(user).
+            with_recipes_preview(recipes_limit))
+
+
+def get_ingredient_search_limit(query_params):
+    """Autocomplete results are capped at `limit` items."""
+    max_limit = settings.INGREDIENT_SEARCH_LIMIT
+    try:
+        limit = int(query_params.get('limit', max_limit))
+    except ValueError:
+        limit = max_limit
+    if not 0 < limit <= max_limit:
+        limit = max_limit
+    return limit
+
+
 class UserViewSet(DjoserUserViewSet):
     """
     Viewset for users/ endpoints, based on Djoser viewset template.
@@ -27,9 +62,21 @@ class UserViewSet(DjoserUserViewSet):
     pagination_class = PageLimitPagination
     queryset = User.objects.all()
 
-    @action(methods=['GET'], detail=False, url_path='subscriptions')
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            return queryset.with_is_subscribed(self.request.user)
+        return queryset
+
+    def _get_subscriptions_queryset(self):
+        return get_authors_queryset(self.request.user,
+                                    self.request.query_params)
+
+    @action(methods=['GET'], detail=False, url_path='subscriptions',
+            url_name='subscriptions')
     def user_subscriptions(self, request):
-        qs = self.queryset.filter(followers__follower=request.user)
+        qs = self._get_subscriptions_queryset().filter(
+            followers__follower=request.user).order_by('id')
         paginated_qs = self.paginate_queryset(qs)
         serializer = SubscriptionSerializer(
             paginated_qs,
@@ -41,7 +88,8 @@ class UserViewSet(DjoserUserViewSet):
     @action(methods=['POST', 'DELETE'],
             detail=True,
             permission_classes=[IsAuthenticated],
-            url_path='subscribe')
+            url_path='subscribe',
+            url_name='subscribe')
     def add_del_subscription(self, request, id):
         user = request.user
         author = get_object_or_404(User, id=id)
@@ -54,6 +102,8 @@ class UserViewSet(DjoserUserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             Subscription.objects.create(follower=user, author=author)
+            serializer.instance = self._get_subscriptions_queryset().get(
+                id=author.id)
             return Response(serializer.data,
                             status=status.HTTP_201_CREATED)
 
@@ -73,6 +123,12 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    snapshot = CatalogSnapshot('tags', Tag.objects.all, TagSerializer)
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return self.snapshot.response(request)
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -84,12 +140,30 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend, filters.SearchFilter)
     filterset_class = IngredientSearchFilter
+    snapshot = CatalogSnapshot(
+        'ingredients', Ingredient.objects.all, IngredientSerializer)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return self.snapshot.response(request)
+
+    def filter_queryset(self, queryset):
+        name = self.request.query_params.get('name')
+        if self.action != 'list' or not name:
+            return super().filter_queryset(queryset)
+        return autocomplete_ingredients(
+            queryset, name,
+            get_ingredient_search_limit(self.request.query_params))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """
     Viewset for recipes/ endpoints: standard CRUD actions,
                                     changes are only for author of object
+    + feed: recipes of followed authors,
+    + similar recipes by ingredients and tags,
+    + recipes to cook from given ingredients,
     + favorites recipes: add/del actions,
     + recipes for shopping: add/del actions, download file with list
                             of unique ingredients.
@@ -101,50 +175,210 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = PageLimitPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipesFilter
+    cursor_pagination_class = RecipeCursorPagination
+
+    @property
+    def paginator(self):
+        """
+        Cursor pagination is switched on by `cursor` query parameter,
+        feed is always paginated by cursor, ranked recipes to cook - by page.
+        """
+        if not hasattr(self, '_paginator'):
+            if self.action == 'feed':
+                self._paginator = FeedCursorPagination()
+            elif self.action == 'cook':
+                self._paginator = self.pagination_class()
+            elif 'cursor' in self.request.query_params:
+                self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
+    def get_queryset(self):
+        if self.action not in ['list', 'retrieve', 'feed', 'cook']:
+            return super().get_queryset()
+        queryset = (Recipe.objects.
+                    with_user_flags(self.request.user).
+                    select_related('author'))
+        if self.action == 'feed':
+            return queryset.feed_for(self.request.user)
+        if self.action in ['list', 'cook']:
+            # tags and portions are prefetched for fragment cache misses only
+            return queryset
+        return queryset.prefetch_related('tags', 'portions__ingredient')
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'feed', 'cook']:
             return ReadRecipeSerializer
         return WriteRecipeSerializer
 
+    @action(methods=['GET'],
+            detail=False,
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Recipes of followed authors, newest first, cursor-paginated."""
+        return self.list(request)
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk):
+        """Top `limit` recipes by shared ingredients, then shared tags."""
+        recipe = get_object_or_404(Recipe, id=pk)
+        max_limit = settings.SIMILAR_RECIPES_MAX_LIMIT
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.SIMILAR_RECIPES_LIMIT))
+        except ValueError:
+            limit = settings.SIMILAR_RECIPES_LIMIT
+        limit = min(max(limit, 1), max_limit)
+        neighbours = similarity.index.neighbours(
+            recipe.id, limit, settings.SIMILAR_RECIPES_TAGS_WEIGHT)
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _ in neighbours])
+        serializer = ShortRecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _ in neighbours
+             if recipe_id in recipes],
+            many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(methods=['GET'], detail=False)
+    def cook(self, request):
+        """
+        Recipes with any of given ingredients: fewest missing ingredients
+        first, then most covered. Filtered by `tags` and `tags_match`.
+        """
+        serializer = CookQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filterset = RecipesFilter(request.query_params, request=request,
+                                  queryset=Recipe.objects.none())
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        tag_ids_by_slug = get_tag_ids_by_slug()
+        ranked = similarity.index.cookable(
+            serializer.validated_data['ingredients'],
+            [tag_ids_by_slug[slug]
+             for slug in filterset.form.cleaned_data.get('tags') or ()],
+            filterset.form.cleaned_data.get('tags_match') == 'all')
+        page = self.paginate_queryset(ranked)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        page = [item for item in page if item[0] in recipes]
+        data = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page], many=True).data
+        for item, (_, covered, missing) in zip(data, page):
+            item['covered_ingredients'] = covered
+            item['missing_ingredients'] = missing
+        return self.get_paginated_response(data)
+
     def _add_or_del_relation(self, model, request, recipe_id):
+        """
+        Single-statement add/delete, safe against concurrent requests:
+        unique constraint decides whether relation already exists.
+        """
         user = request.user
-        recipe = get_object_or_404(Recipe, id=recipe_id)
-        rel_exists = model.objects.filter(user=user, recipe=recipe).exists()
-
-        if not rel_exists and request.method == 'POST':
-            model.objects.create(user=user, recipe=recipe)
+        if request.method == 'POST':
+            recipe = get_object_or_404(Recipe, id=recipe_id)
+            try:
+                with transaction.atomic():
+                    model.objects.create(user=user, recipe=recipe)
+            except IntegrityError:
+                return Response(data={'detail': 'Рецепт уже добавлен'},
+                                status=status.HTTP_400_BAD_REQUEST)
             return Response(ShortRecipeSerializer(recipe).data,
                             status=status.HTTP_201_CREATED)
 
-        if rel_exists and request.method == 'DELETE':
-            relation = model.objects.get(user=user, recipe=recipe)
-            relation.delete()
+        deleted, _ = model.objects.filter(
+            user=user, recipe_id=recipe_id).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
-
+        get_object_or_404(Recipe, id=recipe_id)
         return Response(data={'detail': 'Неверный запрос'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    def _add_or_del_relations(self, model, request):
+        """
+        Batch add/delete of many recipes: one INSERT ... ON CONFLICT
+        DO NOTHING or one DELETE ... WHERE recipe_id IN (...),
+        with result status for every requested id.
+        Deletes send signals, which maintain counters, bulk insert
+        doesn't - counters of added recipes are recounted.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        found = set(Recipe.objects.filter(id__in=ids).
+                    values_list('id', flat=True))
+        relations = model.objects.filter(user=request.user,
+                                         recipe_id__in=found)
+        existing = set(relations.values_list('recipe_id', flat=True))
+        if request.method == 'POST':
+            changed = found - existing
+            model.objects.bulk_create(
+                [model(user=request.user, recipe_id=recipe_id)
+                 for recipe_id in changed],
+                ignore_conflicts=True)
+            recount(Recipe, changed, model.recipe_counter, model, 'recipe')
+            statuses = {'changed': 'added', 'unchanged': 'exists'}
+        else:
+            changed = existing
+            relations.delete()
+            statuses = {'changed': 'removed', 'unchanged': 'absent'}
+        results = []
+        for recipe_id in ids:
+            if recipe_id not in found:
+                result = 'not_found'
+            elif recipe_id in changed:
+                result = statuses['changed']
+            else:
+                result = statuses['unchanged']
+            results.append({'id': recipe_id, 'status': result})
+        return Response({'results': results})
+
     @action(methods=['POST', 'DELETE'],
             detail=True,
             permission_classes=[IsAuthenticated],
-            url_path='favorite')
+            url_path='favorite',
+            url_name='favorite')
     def add_del_favorite_recipe(self, request, pk):
         return self._add_or_del_relation(Favorite, request, pk)
 
+    @action(methods=['POST', 'DELETE'],
+            detail=False,
+            permission_classes=[IsAuthenticated],
+            url_path='favorite',
+            url_name='favorite-batch')
+    def add_del_favorite_recipes(self, request):
+        return self._add_or_del_relations(Favorite, request)
+
     @action(methods=['POST', 'DELETE'],
             detail=True,
             permission_classes=[IsAuthenticated],
-            url_path='shopping_cart')
+            url_path='shopping_cart',
+            url_name='shopping-cart')
     def add_del_recipe_in_shopping_cart(self, request, pk):
         return self._add_or_del_relation(Cart, request, pk)
 
+    @action(methods=['POST', 'DELETE'],
+            detail=False,
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart',
+            url_name='shopping-cart-batch')
+    def add_del_recipes_in_shopping_cart(self, request):
+        return self._add_or_del_relations(Cart, request)
+
     @action(methods=['GET'],
             detail=False,
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer])
     def download_shopping_cart(self, request):
-        shopping_list = request.user.get_shopping_list()
-        response = HttpResponse(shopping_list, 'Content-Type: text/plain')
-        response['Content-Disposition'] = ('attachment; filename='
-                                           f'{settings.SHOP_LIST_FILE}')
+        """
+        Streams shopping list in txt (default), csv or json,
+        chosen by ?format= query parameter.
+        """
+        ext = request.accepted_renderer.format
+        writer, content_type = FORMATS[ext]
+        response = StreamingHttpResponse(writer(request.user),
+                                         content_type=content_type)
+        response['Content-Disposition'] = (
+            'attachment; filename='
+            f'{settings.SHOP_LIST_FILE.format(ext=ext)}')
         return response
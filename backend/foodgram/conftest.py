@@ -0,0 +1 @@
+pytest_plugins = ['api.pytest_plugin']
@@ -28,13 +28,13 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'django_filters',
     'djoser',
-    'debug_toolbar',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,9 +42,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+# N+1 query detector: off, log (staging) or strict (tests), see api.nplusone
+NPLUSONE_MODE = os.getenv('NPLUSONE_MODE', 'off')
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+if NPLUSONE_MODE != 'off':
+    MIDDLEWARE.append('api.nplusone.NPlusOneMiddleware')
+
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -81,6 +90,30 @@ DATABASES = {
     }
 }
 
+# Concurrency tests need a file test database for SQLite: in-memory one
+# fails concurrent writers with "table is locked" instead of waiting
+if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    DATABASES['default']['TEST'] = {
+        'NAME': os.getenv('DB_TEST_NAME', str(BASE_DIR / 'test.sqlite3'))}
+
+# Read replicas: comma separated hosts (file names for SQLite, e.g. a copy
+# of the primary file for local checks), see api.replicas
+
+replica_key = ('NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3')
+               else 'HOST')
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'], replica_key: replica.strip(),
+        'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 10))
+REPLICA_RETRY_SECONDS = 30
+if DATABASE_REPLICAS:
+    MIDDLEWARE.insert(1, 'api.replicas.ReplicaMiddleware')
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -89,6 +122,20 @@ DATABASES = {
 # }
 
 
+# Cache
+# Shared backend (e.g. memcached/redis) is required to propagate
+# catalog versions between workers; local memory is used by default.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Authentication
 
 AUTH_USER_MODEL = 'users.User'
@@ -148,7 +195,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -165,8 +212,59 @@ MIN_COOK_TIME = 1
 MAX_COOK_TIME = 600
 MIN_INGREDIENT_AMOUNT = 1
 MAX_INGREDIENT_AMOUNT = 1000
-SHOP_LIST_FILE = 'shopping_list.txt'
+SHOP_LIST_FILE = 'shopping_list.{ext}'
+INGREDIENT_SEARCH_LIMIT = 50
+RECIPE_FRAGMENT_TIMEOUT = 60 * 60
+RECIPE_COUNT_TIMEOUT = 60
+TAG_IDS_TIMEOUT = 60
+ADMIN_COUNT_LIMIT = 10000
+BATCH_RECIPES_LIMIT = 100
+FEED_FANOUT_ON_WRITE = os.getenv('FEED_FANOUT_ON_WRITE', 'False') == 'True'
+FEED_BACKFILL_SIZE = 100
+FEED_FANOUT_WORKERS = int(os.getenv('FEED_FANOUT_WORKERS', 1))
+
+# Similar recipes: neighbours by ingredients, blended with shared tags
+
+SIMILAR_RECIPES_LIMIT = 6
+SIMILAR_RECIPES_MAX_LIMIT = 50
+SIMILAR_RECIPES_TAGS_WEIGHT = 0.2
+SIMILAR_RECIPES_CACHE_SIZE = 10000
+SIMILAR_RECIPES_LOG_TIMEOUT = 60 * 60
+COOK_INGREDIENTS_LIMIT = 100
+
+# Recipe images: upload limits and resized variants (width in px)
+
+MAX_IMAGE_UPLOAD_SIZE = 5 * 1024 * 1024
+MAX_IMAGE_DIMENSION = 6000
+IMAGE_VARIANT_WIDTHS = {
+    'small': 320,
+    'medium': 640,
+}
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
 
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
+
+# Token -> user cache of API authentication: process-local LRU
+# plus optional shared cache tier, 0 seconds switches a tier off.
+# Logout and token deletion reach other workers only through shared
+# CACHES backend: with local memory one a revoked token would be
+# accepted by other workers for AUTH_TOKEN_CACHE_TTL, so the local
+# tier is off by default then.
+
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = int(os.getenv(
+    'AUTH_TOKEN_CACHE_TTL',
+    0 if CACHES['default']['BACKEND'].endswith('LocMemCache') else 30))
+AUTH_TOKEN_SHARED_CACHE_TTL = int(
+    os.getenv('AUTH_TOKEN_SHARED_CACHE_TTL', 0))
+
+# ASGI deployment: hot read endpoints served by async views,
+# see api.async_views; requires foodgram.asgi under uvicorn workers
+ASGI_MODE = os.getenv('ASGI_MODE', 'False') == 'True'
+
+# Prometheus metrics at /metrics/, empty list - open to all clients
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip
+]
@@ -2,10 +2,13 @@ from django.contrib import admin
 
 from recipes.models import (Cart, Favorite, Ingredient, IngredientPortion,
                             Recipe, Tag)
+from recipes.paginators import CappedCountPaginator
 
 
 class IngredientPortionAdmin(admin.TabularInline):
     model = IngredientPortion
+    autocomplete_fields = ('ingredient',)
+    extra = 1
 
 
 @admin.register(Tag)
@@ -29,7 +32,8 @@ class IngredientAdmin(admin.ModelAdmin):
         'measurement_unit',
     )
     search_fields = ('name',)
-    list_filter = ('name',)
+    show_full_result_count = False
+    paginator = CappedCountPaginator
     empty_value_display = '-пусто-'
 
 
@@ -41,16 +45,18 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'added_to_favorites',
     )
+    list_select_related = ('author',)
     inlines = (IngredientPortionAdmin,)
-    search_fields = ('name', 'tags')
-    autocomplete_fields = ['tags']
-    list_filter = ('author', 'name', 'tags')
+    search_fields = ('name', 'author__username')
+    autocomplete_fields = ('author', 'tags')
+    list_filter = ('tags',)
+    show_full_result_count = False
+    paginator = CappedCountPaginator
     empty_value_display = '-пусто-'
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def added_to_favorites(self, obj):
-        return obj.favorites.count()
-
-    added_to_favorites.short_description = 'В избранном'
+        return obj.favorites_count
 
 
 class UserRecipeAdmin(admin.ModelAdmin):
@@ -59,7 +65,11 @@ class UserRecipeAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
-    search_fields = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'user__email', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+    paginator = CappedCountPaginator
     empty_value_display = '-пусто-'
 
 
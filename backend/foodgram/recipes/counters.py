@@ -0,0 +1,77 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+# (app, model, counter field, related app, related model, related fk)
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'Favorite', 'recipe'),
+    ('recipes', 'Recipe', 'carts_count', 'recipes', 'Cart', 'recipe'),
+    ('users', 'User', 'recipes_count', 'recipes', 'Recipe', 'author'),
+    ('users', 'User', 'followers_count', 'users', 'Subscription', 'author'),
+)
+
+
+def increment(model, pk, field):
+    model.objects.filter(pk=pk).update(**{field: F(field) + 1})
+
+
+def decrement(model, pk, field):
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) - 1, 0)})
+
+
+def recount(model, pks, field, related_model, related_field):
+    """Sets counter of given rows to real number of related rows."""
+    return model.objects.filter(pk__in=pks).update(
+        **{field: actual_count(related_model, related_field)})
+
+
+def actual_count(related_model, related_field):
+    """Subquery with real number of related rows for outer object."""
+    return Coalesce(Subquery(
+        related_model.objects.
+        filter(**{related_field: OuterRef('pk')}).
+        order_by().
+        values(related_field).
+        annotate(total=Count('pk')).
+        values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def reconcile_counter(model, field, related_model, related_field,
+                      chunk_size=10000):
+    """
+    Fixes drifted counter values, walking the table by pk ranges.
+    Returns number of fixed rows.
+    """
+    fixed, last_pk = 0, 0
+    while True:
+        pks = list(model.objects.
+                   filter(pk__gt=last_pk).
+                   order_by('pk').
+                   values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return fixed
+        actual = actual_count(related_model, related_field)
+        drifted = list(model.objects.
+                       filter(pk__gte=pks[0], pk__lte=pks[-1]).
+                       annotate(actual=actual).
+                       exclude(**{field: F('actual')}).
+                       values_list('pk', flat=True))
+        if drifted:
+            fixed += model.objects.filter(pk__in=drifted).update(
+                **{field: actual_count(related_model, related_field)})
+        last_pk = pks[-1]
+
+
+def reconcile_all(get_model, chunk_size=10000, related_to=None):
+    """
+    Yields (counter name, number of fixed rows) for every counter,
+    or only for counters of rows of `related_to` model if it's given.
+    """
+    for app, model, field, related_app, related_model, fk in COUNTERS:
+        related = get_model(related_app, related_model)
+        if related_to is not None and related is not related_to:
+            continue
+        fixed = reconcile_counter(get_model(app, model), field,
+                                  related, fk, chunk_size)
+        yield f'{model}.{field}', fixed
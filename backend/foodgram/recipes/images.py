@@ -0,0 +1,97 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+FORMATS = (
+    ('jpeg', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    ('webp', 'webp', {'quality': 80, 'method': 4}),
+)
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                              thread_name_prefix='recipe-images')
+
+
+def render_variants(image_file):
+    """
+    Resizes image to every width from IMAGE_VARIANT_WIDTHS (never
+    upscaling) and encodes each size as JPEG and WebP.
+    Returns {size_name: {format: bytes}}.
+    """
+    with Image.open(image_file) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        variants = {}
+        for size_name, width in settings.IMAGE_VARIANT_WIDTHS.items():
+            resized = image.copy()
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            variants[size_name] = {}
+            for pil_format, _, options in FORMATS:
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, **options)
+                variants[size_name][pil_format] = buffer.getvalue()
+        return variants
+
+
+def process_recipe_image(recipe_id):
+    """
+    Builds resized JPEG/WebP variants of recipe image, records their
+    storage paths in Recipe.image_variants and removes stale variants.
+    """
+    try:
+        recipe = Recipe.objects.get(id=recipe_id)
+    except Recipe.DoesNotExist:
+        return None
+    old_paths = {path for formats in recipe.image_variants.values()
+                 for path in formats.values()}
+    base, _ = os.path.splitext(recipe.image.name)
+    with recipe.image.open('rb') as image_file:
+        rendered = render_variants(image_file)
+    variants = {}
+    for size_name, formats in rendered.items():
+        variants[size_name] = {}
+        for pil_format, ext, _ in FORMATS:
+            variants[size_name][pil_format] = default_storage.save(
+                f'{base}_{size_name}.{ext}',
+                ContentFile(formats[pil_format]))
+    recipe.image_variants = variants
+    recipe.save(update_fields=['image_variants', 'updated'])
+    for path in old_paths:
+        default_storage.delete(path)
+    return variants
+
+
+def _process_in_worker(recipe_id):
+    close_old_connections()
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('Image processing failed for recipe %s', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_image_processing(recipe_id):
+    """
+    Processes recipe image off the request thread after transaction
+    commit. With IMAGE_PROCESSING_WORKERS = 0 runs synchronously.
+    """
+    def submit():
+        if settings.IMAGE_PROCESSING_WORKERS:
+            get_executor().submit(_process_in_worker, recipe_id)
+        else:
+            process_recipe_image(recipe_id)
+    transaction.on_commit(submit)
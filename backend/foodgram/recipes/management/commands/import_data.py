@@ -0,0 +1,335 @@
+import csv
+import gzip
+import json
+import time
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+
+from django.apps import apps
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from api import fragments
+from api.views import IngredientViewSet, TagViewSet
+from recipes import similarity
+from recipes.counters import reconcile_all
+from recipes.models import (Cart, Favorite, Ingredient, IngredientPortion,
+                            Recipe, Tag)
+from recipes.search import update_index
+from users.models import Subscription, User
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(file):
+    """Streams objects of a top-level JSON array without loading it."""
+    decoder = json.JSONDecoder()
+    buffer, started = '', False
+    for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and buffer[position:position + 1] == '[':
+                started, position = True, position + 1
+                continue
+            if buffer[position:position + 1] in (']', ''):
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item
+        buffer = buffer[position:]
+    if buffer.strip() not in ('', ']'):
+        raise CommandError(f'Ошибка в JSON: {buffer[:100]}')
+
+
+def iter_json_lines(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(file, fields=None):
+    for row in csv.DictReader(file, fieldnames=fields):
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def get_auto_now_add_fields(model):
+    return [field for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now_add', False)]
+
+
+@contextmanager
+def keep_auto_now_add(model):
+    """
+    Lets imported rows keep their own values in auto_now_add fields,
+    rows without them get the current time from importer.
+    """
+    fields = get_auto_now_add_fields(model)
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class ModelImporter:
+    """
+    Upserts batches of rows: by `id` if rows have it, otherwise by natural
+    unique key of the model, or inserts them if the model has none.
+    Existing rows get declared `fields` of the model updated, whichever
+    columns the batch rows have.
+    """
+    def __init__(self, model, unique_fields, fields):
+        self.model = model
+        self.unique_fields = unique_fields
+        self.auto_now_add_fields = [
+            field.attname for field in get_auto_now_add_fields(model)]
+        self.fields = fields
+
+    def prepare(self, row):
+        """
+        Fills auto_now_add fields missing in the row with current time;
+        they are left out of update fields, so existing rows keep theirs.
+        """
+        now = timezone.now()
+        for field in self.auto_now_add_fields:
+            row.setdefault(field, now)
+        return row
+
+    def save(self, objects, unique_fields):
+        if unique_fields is None:
+            # bulk_create returns ids only without conflict handling
+            return self.model.objects.bulk_create(objects)
+        unique = {self.model._meta.get_field(field).attname
+                  for field in unique_fields}
+        update_fields = [field for field in self.fields
+                         if field not in unique]
+        if update_fields:
+            return self.model.objects.bulk_create(
+                objects, update_conflicts=True,
+                unique_fields=unique_fields, update_fields=update_fields)
+        return self.model.objects.bulk_create(objects, ignore_conflicts=True)
+
+    def upsert(self, rows):
+        """Returns objects in order of rows."""
+        rows = [self.prepare(row) for row in rows]
+        objects = [self.model(**row) for row in rows]
+        with_id = [obj for obj, row in zip(objects, rows) if 'id' in row]
+        without_id = [obj for obj, row in zip(objects, rows)
+                      if 'id' not in row]
+        if with_id:
+            self.save(with_id, ('id',))
+        if without_id:
+            self.save(without_id, self.unique_fields)
+        return objects
+
+    def finish(self):
+        pass
+
+
+class TagImporter(ModelImporter):
+    def finish(self):
+        TagViewSet.snapshot.bump_version()
+
+
+class IngredientImporter(ModelImporter):
+    def finish(self):
+        IngredientViewSet.snapshot.bump_version()
+
+
+class UserImporter(ModelImporter):
+    """Passwords are set for new users only, existing ones keep theirs."""
+    def prepare(self, row):
+        row = super().prepare(row)
+        password = row.get('password')
+        if not password:
+            row['password'] = make_password(None)
+            return row
+        try:
+            identify_hasher(password)
+        except ValueError:
+            row['password'] = make_password(password)
+        return row
+
+
+class RecipeImporter(ModelImporter):
+    """
+    Recipes are imported with their portions and tags, given in the same
+    format as API accepts: "ingredients": [{"id": 1, "amount": 10}],
+    "tags": [1, 2]. Portions and tags of existing recipes are replaced.
+    """
+    def __init__(self):
+        super().__init__(Recipe, None, (
+            'author_id', 'name', 'image', 'text', 'cooking_time'))
+
+    def prepare(self, row):
+        if 'author' in row:
+            row['author_id'] = row.pop('author')
+        return super().prepare(row)
+
+    @staticmethod
+    def pop_list(row, key):
+        """Nested lists come as JSON strings from CSV files."""
+        value = row.pop(key, [])
+        return json.loads(value) if isinstance(value, str) else value
+
+    def upsert(self, rows):
+        relations = [(self.pop_list(row, 'ingredients'),
+                      self.pop_list(row, 'tags'))
+                     for row in rows]
+        recipes = super().upsert(rows)
+        ids = [recipe.id for recipe in recipes]
+        # without per-portion signals, fragments are invalidated below
+        old_portions = IngredientPortion.objects.filter(recipe_id__in=ids)
+        old_portions._raw_delete(old_portions.db)
+        Recipe.tags.through.objects.filter(recipe_id__in=ids).delete()
+        portions, recipe_tags = [], []
+        for recipe, (ingredients, tags) in zip(recipes, relations):
+            portions.extend(IngredientPortion(
+                recipe_id=recipe.id,
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount'],
+            ) for ingredient in ingredients)
+            recipe_tags.extend(Recipe.tags.through(
+                recipe_id=recipe.id, tag_id=tag) for tag in tags)
+        IngredientPortion.objects.bulk_create(portions)
+        Recipe.tags.through.objects.bulk_create(recipe_tags)
+        fragments.invalidate(ids)
+        update_index(ids)
+        return recipes
+
+
+IMPORTERS = {
+    'ingredient': lambda: IngredientImporter(
+        Ingredient, ('name', 'measurement_unit'),
+        ('name', 'measurement_unit')),
+    'tag': lambda: TagImporter(Tag, ('slug',), ('name', 'color', 'slug')),
+    'user': lambda: UserImporter(User, ('email',), (
+        'email', 'username', 'first_name', 'last_name')),
+    'recipe': RecipeImporter,
+    'portion': lambda: ModelImporter(IngredientPortion, None, (
+        'recipe_id', 'ingredient_id', 'amount')),
+    'favorite': lambda: ModelImporter(Favorite, ('user', 'recipe'), (
+        'user_id', 'recipe_id')),
+    'cart': lambda: ModelImporter(Cart, ('user', 'recipe'), (
+        'user_id', 'recipe_id')),
+    'subscription': lambda: ModelImporter(
+        Subscription, ('follower', 'author'), ('follower_id', 'author_id')),
+}
+
+
+class Command(BaseCommand):
+    help = ('Streams rows from JSON (array or lines) or CSV file, '
+            'optionally gzipped (.gz), and upserts them into the DB '
+            'in batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the file')
+        parser.add_argument('model', choices=IMPORTERS.keys())
+        parser.add_argument(
+            '--format', choices=('json', 'jsonl', 'csv'),
+            help='File format, by default - from file extension')
+        parser.add_argument(
+            '--fields',
+            help='Comma-separated column names for CSV file without header')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def iter_rows(self, file, file_format, fields):
+        if file_format == 'csv':
+            return iter_csv(file, fields.split(',') if fields else None)
+        if file_format == 'jsonl':
+            return iter_json_lines(file)
+        return iter_json_array(file)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        compressed = path.suffix == '.gz'
+        file_format = options['format'] or Path(
+            path.stem if compressed else path).suffix.lstrip('.')
+        if file_format not in ('json', 'jsonl', 'csv'):
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        importer = IMPORTERS[options['model']]()
+        self.stdout.write(f'Начинаем импорт из файла {path}')
+        started, total = time.perf_counter(), 0
+        try:
+            file = (gzip.open(path, 'rt', encoding='utf-8', newline='')
+                    if compressed else
+                    open(path, encoding='utf-8', newline=''))
+        except FileNotFoundError:
+            raise CommandError(f'Файл {path} не найден')
+        try:
+            with file, keep_auto_now_add(importer.model):
+                rows = self.iter_rows(file, file_format, options['fields'])
+                for batch in batched(rows, options['batch_size']):
+                    self.import_batch(importer, batch, total)
+                    total += len(batch)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'Обработано строк: {total} '
+                        f'({total / elapsed:.0f} строк/с)')
+        except (TypeError, KeyError, ValueError, OSError) as error:
+            raise CommandError(f'Ошибка в строке {total + 1}: {error}')
+        self.reset_sequences(importer.model)
+        importer.finish()
+        # bulk writes don't send signals that maintain counters
+        for counter, fixed in reconcile_all(apps.get_model,
+                                            related_to=importer.model):
+            self.stdout.write(f'{counter}: исправлено строк {fixed}')
+        if importer.model in (Recipe, IngredientPortion):
+            similarity.mark_changed()
+        self.stdout.write(
+            f'Импорт завершен: {total} строк '
+            f'за {time.perf_counter() - started:.1f} с\n'
+            '-------------------------------------------------')
+
+    def import_batch(self, importer, batch, total):
+        try:
+            with transaction.atomic():
+                # importers change rows, originals are kept for errors
+                importer.upsert([dict(row) for row in batch])
+        except IntegrityError as error:
+            number = total + self.find_failed_row(importer, batch)
+            raise CommandError(f'Ошибка в строке {number}: {error}')
+
+    @staticmethod
+    def find_failed_row(importer, batch):
+        """
+        Number of the first row of failed batch, which fails alone,
+        or of the first row of the batch. Nothing is written.
+        """
+        for number, row in enumerate(batch, 1):
+            try:
+                with transaction.atomic():
+                    importer.upsert([dict(row)])
+                    # foreign keys are checked at commit otherwise
+                    connection.check_constraints()
+                    transaction.set_rollback(True)
+            except IntegrityError:
+                return number
+        return 1
+
+    def reset_sequences(self, model):
+        """Rows with explicit ids don't advance PostgreSQL sequences."""
+        models = [model]
+        if model is Recipe:
+            models += [IngredientPortion, Recipe.tags.through]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -1,10 +1,7 @@
-import json
 from pathlib import Path
 
-from django.core.management.base import BaseCommand
-
-from recipes.models import Ingredient, Tag
-from users.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
@@ -12,30 +9,15 @@ class Command(BaseCommand):
 
     def handle(self, *args, **kwargs):
         mapping = (
-            ('ingredients.json', Ingredient),
-            ('tags.json', Tag),
-            ('users.json', User),
+            ('ingredients.json', 'ingredient'),
+            ('tags.json', 'tag'),
+            ('users.json', 'user'),
         )
         for file, model in mapping:
-            self.stdout.write(f'Начинаем импорт из файла {file}')
             try:
-                with open(Path('data', file), encoding='utf-8') as f:
-                    reader = json.load(f)
-            except FileNotFoundError:
+                call_command('import_data', str(Path('data', file)), model,
+                             stdout=self.stdout, stderr=self.stderr)
+            except CommandError as error:
                 self.stderr.write(
-                    f'File {file} не найден\n'
+                    f'{error}\n'
                     '-------------------------------------------------')
-                continue
-            items, counter = [], 0
-            for attrs in reader:
-                try:
-                    items.append(model(**attrs))
-                    counter += 1
-                except TypeError:
-                    self.stderr.write('Ошибка в заполнении фикстур')
-                    continue
-            model.objects.bulk_create(items, ignore_conflicts=True)
-            self.stdout.write(
-                f'Добавлено объектов: {len(reader)}; '
-                f'строк в документе: {counter}\n'
-                '-------------------------------------------------')
@@ -0,0 +1,48 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Builds resized JPEG/WebP copies of recipe images '
+            'and reports time and size savings')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild variants for recipes that already have them')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        total_time, original_size, variants_size = 0, 0, {}
+        for recipe_id, image in recipes.values_list('id',
+                                                    'image').iterator():
+            started = time.perf_counter()
+            try:
+                variants = process_recipe_image(recipe_id)
+                if variants is not None:
+                    original_size += default_storage.size(image)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'Рецепт {recipe_id}: ошибка {error}')
+                continue
+            total_time += time.perf_counter() - started
+            if variants is None:
+                self.stderr.write(f'Рецепт {recipe_id}: удален, пропущен')
+                continue
+            for size_name, formats in variants.items():
+                for image_format, path in formats.items():
+                    key = f'{size_name}/{image_format}'
+                    variants_size[key] = (variants_size.get(key, 0)
+                                          + default_storage.size(path))
+            self.stdout.write(f'Рецепт {recipe_id}: готово')
+        self.stdout.write(
+            f'Время обработки: {total_time:.2f} с\n'
+            f'Оригиналы: {original_size // 1024} Кб')
+        for key, size in variants_size.items():
+            self.stdout.write(f'{key}: {size // 1024} Кб')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.timeline import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds materialized subscriptions feed (fan-out on write) '
+            'from subscriptions, e.g. after FEED_FANOUT_ON_WRITE is on')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int,
+            help='Latest recipes per followed author, '
+                 'by default - FEED_BACKFILL_SIZE')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            total = rebuild(options['size'])
+        self.stdout.write(
+            f'Лента пересобрана: подписок {total} '
+            f'за {time.perf_counter() - started:.1f} с')
@@ -0,0 +1,18 @@
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile_all
+
+
+class Command(BaseCommand):
+    help = ('Recalculates denormalized favorite, cart, recipe and '
+            'follower counters, fixing drifted values in chunks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        for counter, fixed in reconcile_all(apps.get_model,
+                                            options['chunk_size']):
+            self.stdout.write(f'{counter}: исправлено строк {fixed}')
@@ -0,0 +1,46 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import SimilarityIndex
+
+
+class Command(BaseCommand):
+    help = ('Builds in-memory matrix of similar recipes and measures '
+            'top-K lookups on a sample of recipes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int,
+                            default=settings.SIMILAR_RECIPES_LIMIT)
+        parser.add_argument('--sample', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        index = SimilarityIndex()
+        started = time.perf_counter()
+        index.load()
+        self.stdout.write(
+            f'Матрица построена: рецептов {len(index.ingredients)}, '
+            f'ингредиентов {len(index.postings)}, '
+            f'ненулевых ячеек '
+            f'{sum(map(len, index.ingredients.values()))} '
+            f'за {time.perf_counter() - started:.2f} с')
+        recipe_ids = sorted(index.ingredients)
+        sample = random.Random(options['seed']).sample(
+            recipe_ids, min(options['sample'], len(recipe_ids)))
+        timings = []
+        for recipe_id in sample:
+            started = time.perf_counter()
+            index._compute(recipe_id, options['limit'],
+                           settings.SIMILAR_RECIPES_TAGS_WEIGHT)
+            timings.append(time.perf_counter() - started)
+        if not timings:
+            return
+        timings.sort()
+        self.stdout.write(
+            f'Поиск похожих, мс: '
+            f'p50 {timings[len(timings) // 2] * 1000:.2f}, '
+            f'p95 {timings[int(len(timings) * 0.95)] * 1000:.2f}, '
+            f'max {timings[-1] * 1000:.2f}')
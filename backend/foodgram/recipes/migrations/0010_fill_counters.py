@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Counters as of this migration, code of recipes.counters may change
+# (app, model, counter field, related app, related model, related fk)
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'Favorite', 'recipe'),
+    ('recipes', 'Recipe', 'carts_count', 'recipes', 'Cart', 'recipe'),
+    ('users', 'User', 'recipes_count', 'recipes', 'Recipe', 'author'),
+    ('users', 'User', 'followers_count', 'users', 'Subscription', 'author'),
+)
+CHUNK_SIZE = 10000
+
+
+def fill_counters(apps, schema_editor):
+    for app, model, field, related_app, related_model, fk in COUNTERS:
+        model = apps.get_model(app, model)
+        related_model = apps.get_model(related_app, related_model)
+        actual = Coalesce(Subquery(
+            related_model.objects.
+            filter(**{fk: OuterRef('pk')}).
+            order_by().
+            values(fk).
+            annotate(total=Count('pk')).
+            values('total'),
+            output_field=IntegerField(),
+        ), 0)
+        last_pk = 0
+        while True:
+            pks = list(model.objects.
+                       filter(pk__gt=last_pk).
+                       order_by('pk').
+                       values_list('pk', flat=True)[:CHUNK_SIZE])
+            if not pks:
+                break
+            model.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(
+                **{field: actual})
+            last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_counters'),
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
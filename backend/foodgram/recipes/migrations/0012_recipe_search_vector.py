@@ -0,0 +1,53 @@
+# Generated by Django 4.2.1 on 2026-10-18 04:49
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Same vector as recipes.search.get_search_vector()
+VECTOR_SQL = ' || '.join(
+    f"setweight(to_tsvector('{config}'::regconfig, "
+    f"COALESCE({field}, '')), '{weight}')"
+    for field, weight in (('name', 'A'), ('text', 'B'))
+    for config in ('russian', 'english')
+)
+FORWARD_SQL = {
+    'postgresql': (
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin '
+        'ON recipes_recipe USING gin (search_vector)',
+        f'UPDATE recipes_recipe SET search_vector = {VECTOR_SQL}',
+    ),
+    'sqlite': (
+        'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+        "USING fts5(name, text, tokenize='unicode61 remove_diacritics 2')",
+        'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+        'SELECT id, name, text FROM recipes_recipe',
+    ),
+}
+BACKWARD_SQL = {
+    'postgresql': ('DROP INDEX IF EXISTS recipes_recipe_search_vector_gin',),
+    'sqlite': ('DROP TABLE IF EXISTS recipes_recipe_fts',),
+}
+
+
+def run_sql(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_timeline_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_sql(FORWARD_SQL), run_sql(BACKWARD_SQL)),
+    ]
@@ -1,9 +1,10 @@
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
 from django.db import models
 
-from users.models import User
+from users.models import Subscription, User
 
 
 class Ingredient(models.Model):
@@ -17,6 +18,10 @@ class Ingredient(models.Model):
         ordering = ('id',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (models.UniqueConstraint(
+            fields=('name', 'measurement_unit'),
+            name='Уникальная пара Название - Единица измерения'
+        ),)
 
     def __str__(self):
         return self.name
@@ -40,6 +45,42 @@ class Tag(models.Model):
         return self.slug
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Custom queryset for Recipe model with viewer-specific annotations."""
+    def feed_for(self, user):
+        """
+        Recipes of authors followed by user, annotated with `feed_time`
+        to order the feed by. Read from materialized timeline if
+        FEED_FANOUT_ON_WRITE is on, otherwise joined with subscriptions.
+        """
+        if settings.FEED_FANOUT_ON_WRITE:
+            return self.filter(timeline_entries__user=user).annotate(
+                feed_time=models.F('timeline_entries__pub_time'))
+        return self.filter(author__in=Subscription.objects.filter(
+            follower=user).values('author')).annotate(
+                feed_time=models.F('pub_time'))
+
+    def with_user_flags(self, user):
+        """
+        Annotate recipes with is_favorited / is_in_shopping_cart /
+        author_is_subscribed flags for given viewer, so serializers
+        don't query them per object.
+        """
+        if not user.is_authenticated:
+            false = models.Value(False, models.BooleanField())
+            return self.annotate(is_favorited=false,
+                                 is_in_shopping_cart=false,
+                                 author_is_subscribed=false)
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(Cart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            author_is_subscribed=models.Exists(Subscription.objects.filter(
+                follower=user, author=models.OuterRef('author'))),
+        )
+
+
 class Recipe(models.Model):
     """Model Recipe, has relations with Author(User) and Ingredients."""
     author = models.ForeignKey(
@@ -63,12 +104,31 @@ class Recipe(models.Model):
     )
     pub_time = models.DateTimeField(
         verbose_name='Время публикации', auto_now_add=True)
+    updated = models.DateTimeField(
+        verbose_name='Время изменения', auto_now=True)
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии картинки', default=dict,
+        blank=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном', default=0, editable=False)
+    carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах', default=0, editable=False)
+    # PostgreSQL full-text index of name and text, see recipes.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_time',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
+        indexes = (
+            models.Index(fields=('-pub_time', '-id'),
+                         name='recipe_pub_time_id_idx'),
+            models.Index(fields=('author', '-pub_time'),
+                         name='recipe_author_pub_time_idx'),
+        )
 
     def __str__(self):
         return self.name
@@ -117,6 +177,7 @@ class UserRecipeRelation(models.Model):
 
 class Favorite(UserRecipeRelation):
     """Model for m2m relation: User's favorite Recipes."""
+    recipe_counter = 'favorites_count'
 
     class Meta(UserRecipeRelation.Meta):
         verbose_name = 'Рецепт в избранном'
@@ -133,6 +194,8 @@ class Favorite(UserRecipeRelation):
 
 class Cart(UserRecipeRelation):
     """Model for m2m relation: User's shopping cart for Recipes."""
+    recipe_counter = 'carts_count'
+
     class Meta(UserRecipeRelation.Meta):
         verbose_name = 'Рецепт в корзине'
         verbose_name_plural = 'Рецепты в корзине'
@@ -144,3 +207,29 @@ class Cart(UserRecipeRelation):
 
     def __str__(self):
         return f'{self.recipe} in {self.user} cart'
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized feed: recipes of followed authors, written on recipe
+    publication (fan-out on write). Used if FEED_FANOUT_ON_WRITE is on.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name='Пользователь')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, verbose_name='Рецепт')
+    pub_time = models.DateTimeField(verbose_name='Время публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        default_related_name = 'timeline_entries'
+        constraints = (models.UniqueConstraint(
+            fields=('user', 'recipe'),
+            name='Уникальная пара Пользователь - Рецепт в ленте'
+        ),)
+        indexes = (models.Index(fields=('user', '-pub_time', '-recipe'),
+                                name='timeline_user_pub_time_idx'),)
+
+    def __str__(self):
+        return f'{self.recipe} in {self.user} feed'
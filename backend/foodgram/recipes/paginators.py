@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Admin changelist paginator, which counts at most ADMIN_COUNT_LIMIT
+    rows: COUNT(*) over a LIMIT subquery stops early on large tables,
+    filtered or not. Pages beyond the limit are not linked.
+    """
+    @cached_property
+    def count(self):
+        return self.object_list[:settings.ADMIN_COUNT_LIMIT].count()
@@ -0,0 +1,114 @@
+"""
+Full-text search over recipe name and text.
+
+PostgreSQL: stored `Recipe.search_vector` with GIN index, built with
+Russian and English configurations, name weighted above text.
+SQLite (local runs): FTS5 table `recipes_recipe_fts` with rowid = recipe id.
+"""
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, FloatField
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe
+
+CONFIGS = ('russian', 'english')
+FTS_TABLE = 'recipes_recipe_fts'
+TOKEN_RE = re.compile(r'\w+')
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def get_search_vector():
+    vector = None
+    for field, weight in (('name', 'A'), ('text', 'B')):
+        for config in CONFIGS:
+            part = SearchVector(field, config=config, weight=weight)
+            vector = part if vector is None else vector + part
+    return vector
+
+
+def get_search_query(value):
+    query = None
+    for config in CONFIGS:
+        part = SearchQuery(value, config=config, search_type='websearch')
+        query = part if query is None else query | part
+    return query
+
+
+def get_fts_query(value):
+    """Words of the query as FTS5 prefix terms, all required."""
+    return ' '.join(f'"{word}"*' for word in TOKEN_RE.findall(value))
+
+
+def search(queryset, value):
+    """Recipes matching the query, ordered by rank, then newest first."""
+    if is_postgresql():
+        query = get_search_query(value)
+        queryset = queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query))
+    else:
+        fts_query = get_fts_query(value)
+        if not fts_query:
+            return queryset.none()
+        # bm25() is negative, the better match the lower
+        queryset = queryset.annotate(rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = recipes_recipe.id',
+            (fts_query,), output_field=FloatField(),
+        )).filter(rank__isnull=False)
+    return queryset.order_by('-rank', '-pub_time', '-id')
+
+
+def update_index(ids):
+    """Reindexes given recipes, called on recipe write."""
+    ids = list(ids)
+    if not ids:
+        return
+    if is_postgresql():
+        Recipe.objects.filter(id__in=ids).update(
+            search_vector=get_search_vector())
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f'SELECT id, name, text FROM recipes_recipe '
+            f'WHERE id IN ({placeholders})', ids)
+
+
+def remove_from_index(ids):
+    """PostgreSQL vectors are deleted with their rows."""
+    ids = list(ids)
+    if not ids or is_postgresql():
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+
+
+def rebuild_index(chunk_size=2000):
+    """Reindexes all recipes by id chunks, yields number of done ones."""
+    if not is_postgresql():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    last_id, total = 0, 0
+    while True:
+        ids = list(Recipe.objects.
+                   filter(id__gt=last_id).
+                   order_by('id').
+                   values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        update_index(ids)
+        last_id, total = ids[-1], total + len(ids)
+        yield total
@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+
+from django.db.models import Sum
+
+from recipes.models import Cart, IngredientPortion
+
+CHUNK_SIZE = 500
+
+
+def get_shopping_list(user):
+    """
+    Totals of ingredients for all recipes in user's shopping cart.
+    Aggregated in one pass over portions of recipes in the cart,
+    grouped by ingredient id.
+    """
+    return (IngredientPortion.objects.
+            filter(recipe__in=Cart.objects.filter(user=user).values('recipe')).
+            values('ingredient__id',
+                   'ingredient__name',
+                   'ingredient__measurement_unit').
+            annotate(total=Sum('amount')).
+            order_by('ingredient__name', 'ingredient__id'))
+
+
+def _iter_items(user):
+    return get_shopping_list(user).iterator(chunk_size=CHUNK_SIZE)
+
+
+def iter_txt(user):
+    yield f'Список покупок для {user.first_name} {user.last_name}:'
+    for item in _iter_items(user):
+        yield (f"\n - {item['ingredient__name']} "
+               f"({item['ingredient__measurement_unit']}): "
+               f"{item['total']}")
+
+
+def iter_csv(user):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in _iter_items(user):
+        writer.writerow((item['ingredient__name'],
+                         item['ingredient__measurement_unit'],
+                         item['total']))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_json(user):
+    yield '['
+    separator = ''
+    for item in _iter_items(user):
+        yield separator + json.dumps({
+            'id': item['ingredient__id'],
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['total'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+FORMATS = {
+    'txt': (iter_txt, 'text/plain; charset=utf-8'),
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'json': (iter_json, 'application/json'),
+}
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes import search, similarity, timeline
+from recipes.counters import decrement, increment
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Subscription, User
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Cart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        increment(Recipe, instance.recipe_id, sender.recipe_counter)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Cart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    decrement(Recipe, instance.recipe_id, sender.recipe_counter)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_author_recipes(sender, instance, created, **kwargs):
+    if created:
+        increment(User, instance.author_id, 'recipes_count')
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_author_recipes(sender, instance, **kwargs):
+    decrement(User, instance.author_id, 'recipes_count')
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created and settings.FEED_FANOUT_ON_WRITE:
+        timeline.schedule_fan_out(instance.id)
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created and settings.FEED_FANOUT_ON_WRITE:
+        timeline.backfill(instance.follower_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def clean_timeline(sender, instance, **kwargs):
+    if settings.FEED_FANOUT_ON_WRITE:
+        timeline.remove(instance.follower_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(sender, instance, created, update_fields, **kwargs):
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    transaction.on_commit(lambda: search.update_index([instance.id]))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(sender, instance, **kwargs):
+    recipe_id = instance.id
+    transaction.on_commit(lambda: search.remove_from_index([recipe_id]))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_similarity_index(sender, instance, update_fields=None, **kwargs):
+    """Ingredients and tags are written in the same transaction."""
+    if update_fields and set(update_fields) <= {'image_variants', 'updated'}:
+        return
+    recipe_id = instance.id
+    transaction.on_commit(lambda: similarity.mark_changed([recipe_id]))
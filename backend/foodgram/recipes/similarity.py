@@ -0,0 +1,208 @@
+"""
+Similar recipes by ingredient overlap.
+
+Every worker keeps a sparse recipe x ingredient matrix in memory:
+ingredient sets of recipes plus the transposed one, postings
+(ingredient -> recipe ids). Neighbours of a recipe are counted only over
+postings of its own ingredients, scored by Jaccard index of ingredient
+sets, blended with Jaccard index of tag sets, and kept in an LRU cache.
+Candidates sharing too few ingredients to get into the top are pruned.
+The same postings rank recipes by coverage of ingredients a user has.
+
+Changes are logged in the shared cache as (sequence number -> recipe id)
+entries; workers apply the entries they haven't seen yet by reloading
+those recipes, or reload everything if the log has expired.
+"""
+import heapq
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.replicas import use_primary
+from recipes.models import IngredientPortion, Recipe
+
+SEQUENCE_KEY = 'similarity:sequence'
+CHANGE_KEY = 'similarity:change:{}'
+FULL_RELOAD = 0
+
+
+def jaccard(shared, size_a, size_b):
+    union = size_a + size_b - shared
+    return shared / union if union else 0.0
+
+
+def mark_changed(recipe_ids=None):
+    """Logs changed recipes for all workers, None means everything."""
+    for recipe_id in (FULL_RELOAD,) if recipe_ids is None else recipe_ids:
+        cache.add(SEQUENCE_KEY, 0, timeout=None)
+        sequence = cache.incr(SEQUENCE_KEY)
+        cache.set(CHANGE_KEY.format(sequence), recipe_id,
+                  settings.SIMILAR_RECIPES_LOG_TIMEOUT)
+
+
+class SimilarityIndex:
+    def __init__(self, cache_size=None):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._sequence = None
+        self.ingredients = {}
+        self.tags = {}
+        self.postings = defaultdict(set)
+        self.neighbours_cache = OrderedDict()
+
+    def load(self):
+        ingredients, tags = defaultdict(set), defaultdict(set)
+        for recipe_id, ingredient_id in (IngredientPortion.objects.
+                                         values_list('recipe_id',
+                                                     'ingredient_id').
+                                         iterator(chunk_size=10000)):
+            ingredients[recipe_id].add(ingredient_id)
+        for recipe_id, tag_id in (Recipe.tags.through.objects.
+                                  values_list('recipe_id', 'tag_id').
+                                  iterator(chunk_size=10000)):
+            tags[recipe_id].add(tag_id)
+        self.ingredients, self.tags = {}, {}
+        self.postings = defaultdict(set)
+        for recipe_id, recipe_ingredients in ingredients.items():
+            self._add(recipe_id, recipe_ingredients, tags[recipe_id])
+        self.neighbours_cache.clear()
+
+    def _add(self, recipe_id, ingredients, tags):
+        self.ingredients[recipe_id] = frozenset(ingredients)
+        self.tags[recipe_id] = frozenset(tags)
+        for ingredient_id in ingredients:
+            self.postings[ingredient_id].add(recipe_id)
+
+    def _remove(self, recipe_id):
+        for ingredient_id in self.ingredients.pop(recipe_id, ()):
+            self.postings[ingredient_id].discard(recipe_id)
+        self.tags.pop(recipe_id, None)
+
+    def reload(self, recipe_ids):
+        """Rereads ingredients and tags of given recipes only."""
+        ingredients, tags = defaultdict(set), defaultdict(set)
+        for recipe_id, ingredient_id in IngredientPortion.objects.filter(
+                recipe_id__in=recipe_ids).values_list('recipe_id',
+                                                      'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids).values_list('recipe_id', 'tag_id'):
+            tags[recipe_id].add(tag_id)
+        for recipe_id in recipe_ids:
+            self._remove(recipe_id)
+            if ingredients[recipe_id]:
+                self._add(recipe_id, ingredients[recipe_id], tags[recipe_id])
+        # changed recipe may enter or leave neighbours of any other one
+        self.neighbours_cache.clear()
+
+    def sync(self):
+        """
+        Applies changes logged by other workers since the last sync.
+        Rows are read from the primary, as changes are marked seen.
+        """
+        sequence = cache.get(SEQUENCE_KEY, 0)
+        with self._lock, use_primary():
+            if self._sequence is None:
+                self.load()
+            elif sequence != self._sequence:
+                changes = cache.get_many([
+                    CHANGE_KEY.format(number)
+                    for number in range(self._sequence + 1, sequence + 1)])
+                changed = set(changes.values())
+                if (sequence < self._sequence
+                        or len(changes) < sequence - self._sequence
+                        or FULL_RELOAD in changed):
+                    self.load()
+                else:
+                    self.reload(changed)
+            self._sequence = sequence
+
+    def neighbours(self, recipe_id, limit, tags_weight=0.0):
+        """Top `limit` of (recipe id, score), best first."""
+        self.sync()
+        key = (recipe_id, limit, tags_weight)
+        with self._lock:
+            if key in self.neighbours_cache:
+                self.neighbours_cache.move_to_end(key)
+                return self.neighbours_cache[key]
+            result = self._compute(recipe_id, limit, tags_weight)
+            self.neighbours_cache[key] = result
+            if len(self.neighbours_cache) > (
+                    self.cache_size or settings.SIMILAR_RECIPES_CACHE_SIZE):
+                self.neighbours_cache.popitem(last=False)
+        return result
+
+    def _compute(self, recipe_id, limit, tags_weight):
+        ingredients = self.ingredients.get(recipe_id)
+        if not ingredients:
+            return []
+        tags = self.tags[recipe_id]
+        shared = Counter()
+        for ingredient_id in ingredients:
+            shared.update(self.postings[ingredient_id])
+        del shared[recipe_id]
+        # candidates go by shared ingredients count: Jaccard index is not
+        # above count / len(ingredients), so the rest can't get to the top
+        top = []
+        for other_id, count in shared.most_common():
+            bound = (1 - tags_weight) * count / len(ingredients) + tags_weight
+            if len(top) == limit and bound < top[0][0]:
+                break
+            other_tags = self.tags[other_id]
+            score = (
+                (1 - tags_weight) * jaccard(count, len(ingredients),
+                                            len(self.ingredients[other_id]))
+                + tags_weight * jaccard(len(tags & other_tags),
+                                        len(tags), len(other_tags)))
+            if len(top) < limit:
+                heapq.heappush(top, (score, other_id))
+            elif (score, other_id) > top[0]:
+                heapq.heapreplace(top, (score, other_id))
+        return [(other_id, score)
+                for score, other_id in sorted(top, reverse=True)]
+
+    def cookable(self, ingredient_ids, tag_ids=None, match_all_tags=False):
+        """
+        Recipes having any of given ingredients, as RankedRecipes:
+        fewest missing ingredients first, then most covered ones.
+        """
+        self.sync()
+        covered = Counter()
+        with self._lock:
+            for ingredient_id in set(ingredient_ids):
+                covered.update(self.postings.get(ingredient_id, ()))
+            if tag_ids:
+                tag_ids = frozenset(tag_ids)
+                covered = {
+                    recipe_id: count for recipe_id, count in covered.items()
+                    if (tag_ids <= self.tags[recipe_id] if match_all_tags
+                        else tag_ids & self.tags[recipe_id])}
+            keys = [
+                (len(self.ingredients[recipe_id]) - count, -count, -recipe_id)
+                for recipe_id, count in covered.items()]
+        return RankedRecipes(keys)
+
+
+class RankedRecipes:
+    """
+    Sequence of (recipe id, covered, missing) for paginators:
+    only items up to the end of requested slice are sorted.
+    """
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        stop = len(self.keys) if item.stop is None else item.stop
+        return [(-recipe_id, -count, missing)
+                for missing, count, recipe_id
+                in heapq.nsmallest(stop, self.keys)[item]]
+
+
+index = SimilarityIndex()
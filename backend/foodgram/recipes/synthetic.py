@@ -0,0 +1,183 @@
+"""
+Deterministic synthetic data for benchmarks: the same arguments give
+the same rows. Ingredients and tags come from data/ fixtures,
+ingredients catalog can be multiplied by `catalog_scale`.
+"""
+import inspect
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+from recipes import search, similarity, timeline
+from recipes.counters import reconcile_all
+from recipes.management.commands.import_data import keep_auto_now_add
+from recipes.models import (Cart, Favorite, Ingredient, IngredientPortion,
+                            Recipe, Tag)
+from users.models import Subscription, User
+
+BATCH_SIZE = 1000
+PASSWORD = 'benchmark'
+IMAGE = 'recipes/images/benchmark.png'
+START_TIME = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def load_fixture(name):
+    with open(settings.BASE_DIR / 'data' / name, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def create_catalog(catalog_scale=1):
+    rows = load_fixture('ingredients.json')
+    Ingredient.objects.bulk_create([
+        Ingredient(name=row['name'] if copy == 1
+                   else f"{row['name']} {copy}",
+                   measurement_unit=row['measurement_unit'])
+        for copy in range(1, catalog_scale + 1) for row in rows
+    ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+    Tag.objects.bulk_create([
+        Tag(name=row['name'], color=row['color'], slug=row['slug'])
+        for row in load_fixture('tags.json')
+    ], ignore_conflicts=True)
+
+
+def pick_ingredients(rnd, ingredient_ids, count):
+    """Skewed to the catalog start: some ingredients are in most recipes."""
+    picked = set()
+    while len(picked) < min(count, len(ingredient_ids)):
+        picked.add(ingredient_ids[int(len(ingredient_ids)
+                                      * rnd.random() ** 3)])
+    return picked
+
+
+def generate(users=100, recipes=1000, portions=8, favorites=20, carts=5,
+             subscriptions=10, heavy_cart=150, catalog_scale=1, seed=0):
+    """
+    Seeds empty DB. The first user has `heavy_cart` recipes in the
+    shopping cart. Returns numbers of created rows by model name.
+    """
+    rnd = random.Random(seed)
+    create_catalog(catalog_scale)
+    ingredient_ids = list(Ingredient.objects.order_by('id').
+                          values_list('id', flat=True))
+    tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+    names = list(Ingredient.objects.order_by('id').
+                 values_list('name', flat=True)[:500])
+
+    password = make_password(PASSWORD)
+    user_objs = User.objects.bulk_create([
+        User(email=f'user{number}@example.com', username=f'user{number}',
+             first_name=f'Имя{number}', last_name=f'Фамилия{number}',
+             password=password)
+        for number in range(users)
+    ], batch_size=BATCH_SIZE)
+    user_ids = [user.id for user in user_objs]
+
+    with keep_auto_now_add(Recipe):
+        recipe_objs = Recipe.objects.bulk_create([
+            Recipe(author_id=rnd.choice(user_ids),
+                   name=f'{rnd.choice(names).capitalize()} №{number}',
+                   text=' '.join(rnd.choices(names, k=30)),
+                   cooking_time=rnd.randint(1, 120),
+                   image=IMAGE,
+                   pub_time=START_TIME + timedelta(minutes=number))
+            for number in range(recipes)
+        ], batch_size=BATCH_SIZE)
+    recipe_ids = [recipe.id for recipe in recipe_objs]
+
+    IngredientPortion.objects.bulk_create([
+        IngredientPortion(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                          amount=rnd.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in sorted(pick_ingredients(rnd, ingredient_ids,
+                                                     portions))
+    ], batch_size=BATCH_SIZE)
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rnd.sample(tag_ids, rnd.randint(1, 2))
+    ], batch_size=BATCH_SIZE)
+
+    for model, per_user in ((Favorite, favorites), (Cart, carts)):
+        with keep_auto_now_add(model):
+            model.objects.bulk_create([
+                model(user_id=user_id, recipe_id=recipe_id, added=START_TIME)
+                for number, user_id in enumerate(user_ids)
+                for recipe_id in rnd.sample(
+                    recipe_ids,
+                    min(heavy_cart if model is Cart and number == 0
+                        else per_user, len(recipe_ids)))
+            ], batch_size=BATCH_SIZE)
+    Subscription.objects.bulk_create([
+        Subscription(follower_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in rnd.sample(user_ids, min(subscriptions + 1,
+                                                  len(user_ids)))
+        if author_id != user_id
+    ], batch_size=BATCH_SIZE)
+
+    # bulk writes don't send signals maintaining derived data
+    for _ in reconcile_all(apps.get_model):
+        pass
+    for _ in search.rebuild_index():
+        pass
+    similarity.mark_changed()
+    if settings.FEED_FANOUT_ON_WRITE:
+        timeline.rebuild()
+    return {model.__name__: model.objects.count()
+            for model in (User, Ingredient, Recipe, IngredientPortion,
+                          Favorite, Cart, Subscription)}
+
+
+def follow_authors(follower, count, recipes_per_author=3):
+    """
+    Makes `follower` follow exactly `count` authors with recipes,
+    creating missing authors with `recipes_per_author` recipes each.
+    """
+    author_ids = list(User.objects.
+                      exclude(id=follower.id).
+                      filter(recipes_count__gt=0).
+                      order_by('id').
+                      values_list('id', flat=True)[:count])
+    if len(author_ids) < count:
+        first = User.objects.count()
+        password = make_password(PASSWORD)
+        new_authors = User.objects.bulk_create([
+            User(email=f'author{number}@example.com',
+                 username=f'author{number}', first_name=f'Имя{number}',
+                 last_name=f'Фамилия{number}', password=password,
+                 recipes_count=recipes_per_author)
+            for number in range(first, first + count - len(author_ids))
+        ], batch_size=BATCH_SIZE)
+        with keep_auto_now_add(Recipe):
+            Recipe.objects.bulk_create([
+                Recipe(author_id=author.id, name=f'Рецепт автора {number}',
+                       text='Описание', cooking_time=10, image=IMAGE,
+                       pub_time=START_TIME + timedelta(seconds=number))
+                for number, author in enumerate(
+                    new_authors * recipes_per_author)
+            ], batch_size=BATCH_SIZE)
+        author_ids += [author.id for author in new_authors]
+    Subscription.objects.filter(follower=follower).exclude(
+        author_id__in=author_ids).delete()
+    Subscription.objects.bulk_create([
+        Subscription(follower=follower, author_id=author_id)
+        for author_id in author_ids
+    ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+    for _ in reconcile_all(apps.get_model, related_to=Subscription):
+        pass
+
+
+def add_arguments(parser):
+    """Integer command options for all arguments of generate()."""
+    for name, parameter in inspect.signature(generate).parameters.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int,
+                            default=parameter.default)
+
+
+def generate_from_options(options):
+    return generate(**{name: options[name]
+                       for name in inspect.signature(generate).parameters})
@@ -0,0 +1,65 @@
+from django.test import TestCase, override_settings
+from recipes.models import Cart, Favorite, Recipe
+from recipes.paginators import CappedCountPaginator
+from users.models import Subscription, User
+
+from api.tests.factories import (create_ingredients, create_recipe,
+                                 create_tags, create_user)
+
+# session and user; then COUNT and page, for recipes also tags of filter
+CHANGELIST_QUERIES = {
+    'recipes/recipe': 5,
+    'recipes/ingredient': 4,
+    'recipes/favorite': 4,
+    'recipes/cart': 4,
+    'users/user': 4,
+    'users/subscription': 4,
+}
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Changelists cost fixed number of queries for any number of rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin',
+            first_name='Имя', last_name='Фамилия', password='password')
+        cls.tags = create_tags()
+        cls.ingredients = create_ingredients()
+        cls.users = []
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            user = create_user(len(self.users) + 1)
+            recipe = create_recipe(user, self.tags, self.ingredients[:2])
+            Favorite.objects.create(user=user, recipe=recipe)
+            Cart.objects.create(user=user, recipe=recipe)
+            if self.users:
+                Subscription.objects.create(follower=user,
+                                            author=self.users[-1])
+            self.users.append(user)
+
+    def test_changelist_queries_do_not_depend_on_rows(self):
+        for count in (3, 12):
+            self.add_rows(count)
+            for name, queries in CHANGELIST_QUERIES.items():
+                for query in ('', '?q=user'):
+                    with self.subTest(rows=len(self.users), changelist=name,
+                                      query=query):
+                        with self.assertNumQueries(queries):
+                            response = self.client.get(
+                                f'/admin/{name}/{query}')
+                        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ADMIN_COUNT_LIMIT=5)
+    def test_count_is_capped(self):
+        self.add_rows(8)
+        paginator = CappedCountPaginator(Recipe.objects.order_by('id'), 2)
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 3)
+        response = self.client.get('/admin/recipes/recipe/?q=user')
+        self.assertEqual(response.context['cl'].result_count, 5)
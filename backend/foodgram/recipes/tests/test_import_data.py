@@ -0,0 +1,95 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import IngredientPortion, Recipe, Tag
+from users.models import User
+
+from api.tests.factories import (IMAGE, create_ingredients, create_recipe,
+                                 create_tags, create_user)
+
+
+class ImportDataTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(1)
+        cls.tags = create_tags()
+        cls.ingredients = create_ingredients()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def import_rows(self, model, rows):
+        path = Path(self.directory.name, f'{model}.jsonl')
+        path.write_text('\n'.join(json.dumps(row) for row in rows),
+                        encoding='utf-8')
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_data', str(path), model, stdout=StringIO())
+        return len(queries)
+
+    def recipe_rows(self, recipes, portions):
+        return [{
+            'id': recipe.id,
+            'author': self.author.id,
+            'name': f'Новый {recipe.name}',
+            'image': IMAGE,
+            'text': 'Текст',
+            'cooking_time': 5,
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': ingredient.id, 'amount': 1}
+                            for ingredient in self.ingredients[:portions]],
+        } for recipe in recipes]
+
+    def test_recipe_queries_do_not_depend_on_portions(self):
+        recipes = [create_recipe(self.author, self.tags, self.ingredients,
+                                 name=f'Рецепт {number}')
+                   for number in range(5)]
+        counts = [self.import_rows('recipe',
+                                   self.recipe_rows(recipes, portions))
+                  for portions in (2, 8, 1)]
+        self.assertEqual(len(set(counts)), 1, counts)
+        self.assertEqual(
+            IngredientPortion.objects.filter(recipe__in=recipes).count(),
+            len(recipes))
+        self.assertTrue(all(recipe.name.startswith('Новый') for recipe
+                            in Recipe.objects.filter(id__in=[
+                                recipe.id for recipe in recipes])))
+
+    def test_recipe_update_moves_fragment_keys(self):
+        recipe = create_recipe(self.author, self.tags, self.ingredients)
+        self.import_rows('recipe', self.recipe_rows([recipe], 3))
+        recipe.refresh_from_db()
+        self.assertGreater(recipe.updated, recipe.pub_time)
+        self.assertEqual(recipe.portions.count(), 3)
+
+    def test_rows_with_different_columns(self):
+        user = create_user(2)
+        password = user.password
+        self.import_rows('user', [
+            {'email': self.author.email, 'username': self.author.username,
+             'first_name': 'Новое'},
+            {'email': user.email, 'username': user.username,
+             'first_name': 'Новое', 'last_name': 'Новая'},
+        ])
+        user.refresh_from_db()
+        self.assertEqual(user.last_name, 'Новая')
+        self.assertEqual(user.password, password)
+        self.assertEqual(User.objects.get(id=self.author.id).first_name,
+                         'Новое')
+
+    def test_rows_with_and_without_id(self):
+        self.import_rows('tag', [
+            {'id': self.tags[0].id, 'name': 'Новый 0', 'color': '#111111',
+             'slug': 'tag0'},
+            {'name': 'Новый 1', 'color': '#222222', 'slug': 'tag1'},
+        ])
+        self.assertEqual(
+            list(Tag.objects.order_by('slug').values_list('name', flat=True)),
+            ['Новый 0', 'Новый 1', 'Тег 2'])
@@ -0,0 +1,57 @@
+import io
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from recipes import images
+from recipes.models import Recipe
+
+from api.tests.factories import create_recipe, create_user
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def save_image(name):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProcessImagesTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        author = create_user(1)
+        self.recipes = [create_recipe(author, name=f'Рецепт {number}')
+                        for number in range(2)]
+        for recipe in self.recipes:
+            recipe.image = save_image(f'recipes/images/{recipe.id}.png')
+            recipe.save(update_fields=['image'])
+
+    def test_recipe_deleted_during_run_is_skipped(self):
+        deleted, kept = self.recipes
+
+        def process_after_deletion(recipe_id):
+            if recipe_id == deleted.id:
+                Recipe.objects.filter(id=recipe_id).delete()
+            return images.process_recipe_image(recipe_id)
+
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('recipes.management.commands.process_images.'
+                        'process_recipe_image', process_after_deletion):
+            call_command('process_images', stdout=stdout, stderr=stderr)
+        self.assertIn(f'Рецепт {deleted.id}: удален', stderr.getvalue())
+        self.assertIn(f'Рецепт {kept.id}: готово', stdout.getvalue())
+        kept.refresh_from_db()
+        self.assertTrue(kept.image_variants)
@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes import timeline
+from recipes.models import TimelineEntry
+from users.models import Subscription, User
+
+from api.tests.factories import create_recipe, create_user
+
+
+@override_settings(FEED_FANOUT_ON_WRITE=True, FEED_FANOUT_WORKERS=1)
+class FanOutTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(0)
+        followers = User.objects.bulk_create([
+            User(email=f'follower{number}@example.com',
+                 username=f'follower{number}')
+            for number in range(30)])
+        Subscription.objects.bulk_create([
+            Subscription(follower=follower, author=cls.author)
+            for follower in followers])
+
+    def test_fan_out_runs_off_request_thread(self):
+        with mock.patch('recipes.timeline.get_executor') as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe = create_recipe(self.author)
+        get_executor.return_value.submit.assert_called_once_with(
+            timeline._fan_out_in_worker, recipe.id)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @mock.patch('recipes.timeline.CHUNK_SIZE', 7)
+    def test_fan_out_inserts_in_chunks(self):
+        with self.captureOnCommitCallbacks():
+            recipe = create_recipe(self.author)
+        with CaptureQueriesContext(connection) as context:
+            timeline.fan_out(recipe.id)
+        inserts = [query for query in context.captured_queries
+                   if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 5)
+        self.assertEqual(
+            TimelineEntry.objects.filter(recipe=recipe).count(), 30)
+
+    def test_deleted_recipe_is_skipped(self):
+        with self.captureOnCommitCallbacks():
+            recipe = create_recipe(self.author)
+        recipe_id = recipe.id
+        recipe.delete()
+        timeline.fan_out(recipe_id)
+        self.assertFalse(TimelineEntry.objects.exists())
@@ -0,0 +1,111 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from recipes.models import Recipe, TimelineEntry
+from users.models import Subscription
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(max_workers=settings.FEED_FANOUT_WORKERS,
+                              thread_name_prefix='feed-fan-out')
+
+
+def fan_out(recipe_id):
+    """
+    Writes new recipe into timelines of all followers of its author,
+    each chunk of followers in its own INSERT.
+    """
+    recipe = (Recipe.objects.
+              filter(id=recipe_id).
+              values('author_id', 'pub_time').
+              first())
+    if recipe is None:
+        return
+    followers = (Subscription.objects.
+                 filter(author_id=recipe['author_id']).
+                 values_list('follower_id', flat=True).
+                 iterator(chunk_size=CHUNK_SIZE))
+    entries = []
+    for follower_id in followers:
+        entries.append(TimelineEntry(user_id=follower_id, recipe_id=recipe_id,
+                                     pub_time=recipe['pub_time']))
+        if len(entries) >= CHUNK_SIZE:
+            TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            entries = []
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def _fan_out_in_worker(recipe_id):
+    close_old_connections()
+    try:
+        fan_out(recipe_id)
+    except Exception:
+        logger.exception('Feed fan-out failed for recipe %s', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_fan_out(recipe_id):
+    """
+    Fans new recipe out off the request thread after transaction commit,
+    so the author doesn't wait for inserts for every follower.
+    Timelines of fan-outs lost on worker restart are restored by
+    `rebuild_timeline`. With FEED_FANOUT_WORKERS = 0 runs synchronously.
+    """
+    def submit():
+        if settings.FEED_FANOUT_WORKERS:
+            get_executor().submit(_fan_out_in_worker, recipe_id)
+        else:
+            fan_out(recipe_id)
+    transaction.on_commit(submit)
+
+
+def backfill(follower_id, author_id, size=None):
+    """Adds latest recipes of newly followed author to user timeline."""
+    size = size or settings.FEED_BACKFILL_SIZE
+    recipes = (Recipe.objects.
+               filter(author_id=author_id).
+               order_by('-pub_time').
+               values_list('id', 'pub_time')[:size])
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=follower_id, recipe_id=recipe_id,
+                       pub_time=pub_time)
+         for recipe_id, pub_time in recipes],
+        ignore_conflicts=True)
+
+
+def remove(follower_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=follower_id, recipe__author_id=author_id).delete()
+
+
+def rebuild_for(follower_id, size=None):
+    """Rebuilds timeline of one user from the user's subscriptions."""
+    TimelineEntry.objects.filter(user_id=follower_id).delete()
+    for author_id in (Subscription.objects.
+                      filter(follower_id=follower_id).
+                      values_list('author_id', flat=True).
+                      iterator(chunk_size=CHUNK_SIZE)):
+        backfill(follower_id, author_id, size)
+
+
+def rebuild(size=None):
+    """Rebuilds all timelines from subscriptions. Returns followings."""
+    TimelineEntry.objects.all().delete()
+    total = 0
+    for follower_id, author_id in (Subscription.objects.
+                                   order_by('id').
+                                   values_list('follower_id', 'author_id').
+                                   iterator(chunk_size=CHUNK_SIZE)):
+        backfill(follower_id, author_id, size)
+        total += 1
+    return total
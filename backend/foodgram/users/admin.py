@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from recipes.paginators import CappedCountPaginator
 from users.models import User, Subscription
 
 
@@ -13,7 +14,9 @@ class UserAdmin(admin.ModelAdmin):
         'last_name',
     )
     search_fields = ('email', 'username')
-    list_filter = ('email', 'username')
+    list_filter = ('is_staff', 'is_admin')
+    show_full_result_count = False
+    paginator = CappedCountPaginator
     empty_value_display = '-пусто-'
 
 
@@ -24,6 +27,9 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'follower',
         'author',
     )
-    search_fields = ('follower', 'author')
-    list_filter = ('id',)
+    list_select_related = ('follower', 'author')
+    search_fields = ('follower__username', 'author__username')
+    autocomplete_fields = ('follower', 'author')
+    show_full_result_count = False
+    paginator = CappedCountPaginator
     empty_value_display = '-пусто-'
@@ -1,7 +1,41 @@
 from django.contrib.auth.models import BaseUserManager
+from django.db import models
+from django.db.models.functions import RowNumber
 
 
-class UserManager(BaseUserManager):
+class UserQuerySet(models.QuerySet):
+    """Custom queryset for User model with viewer-specific annotations."""
+    def with_is_subscribed(self, user):
+        """Annotate each author with subscription flag for given viewer."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_subscribed=models.Value(False, models.BooleanField()))
+        from users.models import Subscription
+        return self.annotate(is_subscribed=models.Exists(
+            Subscription.objects.filter(
+                follower=user, author=models.OuterRef('pk'))))
+
+    def with_recipes_preview(self, recipes_limit=None):
+        """
+        Prefetch latest recipes of authors into `recipes_preview`.
+        The per-author limit is applied in SQL with ROW_NUMBER()
+        partitioned by author, so the whole page costs one extra query
+        whatever the limit is.
+        """
+        from recipes.models import Recipe
+        recipes = Recipe.objects.order_by('-pub_time', '-id')
+        if recipes_limit is not None:
+            recipes = recipes.annotate(row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=models.F('author'),
+                order_by=(models.F('pub_time').desc(),
+                          models.F('id').desc()),
+            )).filter(row_number__lte=recipes_limit)
+        return self.prefetch_related(models.Prefetch(
+            'recipes', queryset=recipes, to_attr='recipes_preview'))
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """
     Custom user model manager where email is the unique identifier
     for authentication instead of usernames.
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.counters import decrement, increment
+from users.models import Subscription, User
+
+
+@receiver(post_save, sender=Subscription)
+def increment_followers(sender, instance, created, **kwargs):
+    if created:
+        increment(User, instance.author_id, 'followers_count')
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_followers(sender, instance, **kwargs):
+    decrement(User, instance.author_id, 'followers_count')